@@ -5,236 +5,865 @@ Acceptor component implementation for Paxos protocol.
 import os
 import time
 import json
-import uuid
+import struct
+import itertools
+import ctypes
+import ctypes.util
+import queue
+import threading
 from typing import Dict, Any, List, Optional, Tuple
 
+import msgpack
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
 
 from common.constants import (
     PREPARE, ACCEPT, HEARTBEAT, 
-    PROMISE, NOT_PROMISE, ACCEPTED, NOT_ACCEPTED, LEARN
+    PROMISE, NOT_PROMISE, ACCEPTED, NOT_ACCEPTED, LEARN,
+    MAX_BATCH, MAX_BATCH_MS, COMMIT_FALLBACK_MS
 )
 from common.message import (
     PrepareMessage, AcceptMessage, HeartbeatMessage, 
     PromiseMessage, NotPromiseMessage, AcceptedMessage, NotAcceptedMessage, LearnMessage
 )
-from common.utils import setup_logger, save_to_file, load_from_file
+from common.utils import setup_logger, load_from_file, atomic_write, pack_learns, LEARN_HEADERS
+
+
+# Write-ahead log records are a 4-byte big-endian length followed by msgpack
+_RECORD_HEADER = struct.Struct('>I')
+
+# Proposers whose last heartbeat is tracked; the oldest is dropped beyond this
+_MAX_TRACKED_PROPOSERS = 16
+
+# Proposal records kept for inspection; promise/accept safety only needs the header fields
+_MAX_PROPOSAL_HISTORY = 1024
+
+# Log sync modes
+SYNC_FDATASYNC = "fdatasync"
+SYNC_FILE_RANGE = "sync_file_range"
+
+# sync_file_range(2) flags from <fcntl.h>
+_SYNC_FILE_RANGE_WAIT_BEFORE = 1
+_SYNC_FILE_RANGE_WRITE = 2
+_SYNC_FILE_RANGE_WAIT_AFTER = 4
+
+
+def _load_sync_file_range():
+    """Bind sync_file_range(2) from libc, or return None where it is unavailable."""
+    try:
+        libc = ctypes.CDLL(ctypes.util.find_library('c'), use_errno=True)
+        func = libc.sync_file_range
+    except (OSError, AttributeError):
+        return None
+    func.argtypes = [ctypes.c_int, ctypes.c_int64, ctypes.c_int64, ctypes.c_uint]
+    func.restype = ctypes.c_int
+    return func
+
+
+_sync_file_range = _load_sync_file_range()
+
+
+def _persist(fd: int, offset: int, nbytes: int, sync_mode: str = SYNC_FDATASYNC) -> None:
+    """Flush a just-written byte range of `fd` to disk.
+    
+    In sync_file_range mode only the dirty pages of that range are written
+    back and waited on. This skips the inode and the device cache flush, so
+    it is faster than fdatasync but is not crash-proof on every filesystem.
+    It falls back to fdatasync where the call is not available.
+    """
+    if sync_mode == SYNC_FILE_RANGE and _sync_file_range is not None:
+        flags = (_SYNC_FILE_RANGE_WAIT_BEFORE | _SYNC_FILE_RANGE_WRITE |
+                 _SYNC_FILE_RANGE_WAIT_AFTER)
+        if _sync_file_range(fd, offset, nbytes, flags) != 0:
+            errno = ctypes.get_errno()
+            raise OSError(errno, os.strerror(errno))
+        return
+    os.fdatasync(fd)
+
+
+def _decode(data: bytes) -> Any:
+    """Decode a msgpack payload, or a JSON one written by an older version."""
+    # A msgpack record is a map, which never starts with '{'
+    if data[:1] == b'{':
+        return orjson.loads(data)
+    return msgpack.unpackb(data, strict_map_key=False)
+
+
+def _read_log_records(log_path: str) -> Tuple[List[Dict[str, Any]], int]:
+    """Read all complete records from a write-ahead log.
+    
+    Returns the records and the offset just past the last complete one.
+    Reading stops at the zero padding of the preallocated tail or at a
+    torn record left by a crash.
+    """
+    if not os.path.exists(log_path):
+        return [], 0
+    
+    with open(log_path, 'rb') as f:
+        data = f.read()
+    
+    records = []
+    offset = 0
+    while offset + _RECORD_HEADER.size <= len(data):
+        (length,) = _RECORD_HEADER.unpack_from(data, offset)
+        start = offset + _RECORD_HEADER.size
+        if length == 0 or start + length > len(data):
+            break
+        try:
+            records.append(_decode(data[start:start + length]))
+        except ValueError:
+            break
+        offset = start + length
+    return records, offset
+
+
+def _int_keys(proposals: Dict[Any, Any]) -> Dict[int, Any]:
+    """Restore integer proposal-number keys, which older JSON files store as strings."""
+    return {int(key): record for key, record in proposals.items()}
+
+
+class _CommitQueue:
+    """Group commit for acceptor state over an append-only write-ahead log.
+    
+    Handlers append one record per state change and every pending record is
+    written with one write and one sync. Under light load the waiting caller
+    flushes inline, so a lone commit pays no hand-off or linger; once batches
+    keep picking up several records (`activate_after` in a row) a writer
+    thread takes over and lingers `max_wait` to coalesce, and it hands back
+    after `deactivate_after` batches in a row carry a single record. Every
+    `checkpoint_every` records or `checkpoint_interval` seconds the full
+    state is written to the snapshot file and the log is truncated.
+    
+    The log is preallocated in `preallocate`-byte steps and written at an
+    explicit offset, so the file size only changes when a new step is
+    reserved and fdatasync usually has no metadata to flush.
+    """
+    
+    def __init__(self, log_path: str, snapshot_path: str, serialize, logger,
+                 log_offset: int = 0, max_batch: int = 64, max_wait: float = 0.002,
+                 checkpoint_every: int = 1000, checkpoint_interval: float = 60.0,
+                 preallocate: int = 65536, sync_mode: str = SYNC_FDATASYNC,
+                 activate_after: int = 2, deactivate_after: int = 8):
+        """Open the log and start the writer.
+        
+        `serialize` returns the full state as bytes; `log_offset` is where
+        the last complete record of the existing log ends.
+        """
+        self.log_path = log_path
+        self.snapshot_path = snapshot_path
+        self.serialize = serialize
+        self.logger = logger
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.checkpoint_every = checkpoint_every
+        self.checkpoint_interval = checkpoint_interval
+        self.preallocate = preallocate
+        self.sync_mode = sync_mode
+        self.activate_after = activate_after
+        self.deactivate_after = deactivate_after
+        
+        os.makedirs(os.path.dirname(log_path), exist_ok=True)
+        self._log_fd = os.open(log_path, os.O_WRONLY | os.O_CREAT, 0o644)
+        
+        # Drop any torn tail, then reserve space past the last record
+        os.ftruncate(self._log_fd, log_offset)
+        self._log_offset = log_offset
+        self._log_allocated = log_offset
+        self._reserve(log_offset + preallocate)
+        self._records_since_checkpoint = 0
+        self._last_checkpoint = time.time()
+        
+        # Scratch buffer a batch is assembled in, reused across batches
+        self._buf = bytearray(8192)
+        self._packer = msgpack.Packer(use_bin_type=True)
+        
+        self._cond = threading.Condition()
+        self._pending = []  # [record_bytes, done_event, success] entries waiting for durability
+        self._io_lock = threading.Lock()  # Held while a batch is taken and written, keeps log order
+        
+        # Batching mode, switched on and off by how many records recent batches carried
+        self._batching = False
+        self._should_active_cnt = 0
+        self._should_deact_cnt = 0
+        
+        self._thread = threading.Thread(target=self._writer_loop)
+        self._thread.daemon = True
+        self._thread.start()
+    
+    def append(self, record: Dict[str, Any]) -> list:
+        """Queue a record for the log and return a ticket to wait on.
+        
+        Submission and completion are split so the caller can keep working
+        (e.g. build its response) while the writer drives the I/O. Callers
+        hold the acceptor lock so records reach the log in the same order
+        the state changes were made.
+        """
+        entry = [self._packer.pack(record), threading.Event(), False]
+        with self._cond:
+            self._pending.append(entry)
+            if self._batching:
+                self._cond.notify_all()
+        return entry
+    
+    def wait(self, entry: list) -> bool:
+        """Block until the record behind `entry` is durable on disk."""
+        while not entry[1].is_set():
+            if self._batching:
+                # Re-check now and then in case batching is switched off under us
+                entry[1].wait(self.max_wait)
+            else:
+                # Light load: sync on the caller's thread instead of handing off
+                self._flush()
+        return entry[2]
+    
+    def _writer_loop(self) -> None:
+        """Drain pending records in lingering batches while batching is on."""
+        while True:
+            with self._cond:
+                while not (self._pending and self._batching):
+                    self._cond.wait()
+                
+                # Linger briefly so commits arriving together share the sync
+                deadline = time.time() + self.max_wait
+                while len(self._pending) < self.max_batch:
+                    remaining = deadline - time.time()
+                    if remaining <= 0:
+                        break
+                    self._cond.wait(remaining)
+            
+            self._flush()
+    
+    def _flush(self) -> None:
+        """Write and sync whatever is pending as one batch, then wake its waiters."""
+        with self._io_lock:
+            with self._cond:
+                batch = self._pending[:self.max_batch]
+                del self._pending[:self.max_batch]
+            if not batch:
+                return
+            
+            success = self._write(self._fill_buffer(batch))
+            for entry in batch:
+                entry[2] = success
+                entry[1].set()
+            self._update_mode(len(batch))
+            
+            if success:
+                self._records_since_checkpoint += len(batch)
+                if (self._records_since_checkpoint >= self.checkpoint_every or
+                        time.time() - self._last_checkpoint >= self.checkpoint_interval):
+                    self._checkpoint()
+    
+    def _update_mode(self, batch_size: int) -> None:
+        """Switch batching on under sustained concurrency and off once it subsides."""
+        if batch_size > 1:
+            self._should_deact_cnt = 0
+            self._should_active_cnt += 1
+            if not self._batching and self._should_active_cnt >= self.activate_after:
+                with self._cond:
+                    self._batching = True
+                    self._cond.notify_all()
+                self.logger.debug("State log switched to batched sync")
+        else:
+            self._should_active_cnt = 0
+            self._should_deact_cnt += 1
+            if self._batching and self._should_deact_cnt >= self.deactivate_after:
+                self._batching = False
+                self.logger.debug("State log switched to inline sync")
+    
+    def _fill_buffer(self, batch: list) -> memoryview:
+        """Frame a batch of records into the scratch buffer and return a view of it."""
+        size = sum(_RECORD_HEADER.size + len(entry[0]) for entry in batch)
+        if size > len(self._buf):
+            self._buf = bytearray(max(size, 2 * len(self._buf)))
+        
+        buf = self._buf
+        offset = 0
+        for entry in batch:
+            data = entry[0]
+            _RECORD_HEADER.pack_into(buf, offset, len(data))
+            offset += _RECORD_HEADER.size
+            buf[offset:offset + len(data)] = data
+            offset += len(data)
+        return memoryview(buf)[:offset]
+    
+    def _reserve(self, size: int) -> None:
+        """Make sure the log has `size` bytes allocated, growing it in whole steps."""
+        if size <= self._log_allocated:
+            return
+        self._log_allocated = -(-size // self.preallocate) * self.preallocate
+        os.posix_fallocate(self._log_fd, 0, self._log_allocated)
+    
+    def _write(self, data: memoryview) -> bool:
+        """Append data to the log and flush it to disk."""
+        try:
+            end = self._log_offset + len(data)
+            self._reserve(end)
+            os.pwrite(self._log_fd, data, self._log_offset)
+            _persist(self._log_fd, self._log_offset, len(data), self.sync_mode)
+            self._log_offset = end
+            return True
+        except Exception as e:
+            self.logger.error(f"Error appending to state log {self.log_path}: {e}")
+            return False
+    
+    def _checkpoint(self) -> None:
+        """Write a full snapshot and truncate the log.
+        
+        The snapshot may already reflect records still queued behind it;
+        replaying those on load is harmless because each record carries the
+        full header and the last one queued matches the snapshot.
+        """
+        try:
+            atomic_write(self.snapshot_path, self.serialize())
+            
+            os.ftruncate(self._log_fd, 0)
+            self._log_offset = 0
+            self._log_allocated = 0
+            self._reserve(self.preallocate)
+            
+            self._records_since_checkpoint = 0
+            self._last_checkpoint = time.time()
+            self.logger.debug(f"Checkpointed state to {self.snapshot_path}")
+        except Exception as e:
+            self.logger.error(f"Error checkpointing state to {self.snapshot_path}: {e}")
 
 
 class Acceptor:
     """Acceptor implementation for Paxos protocol."""
     
-    def __init__(self, acceptor_id: str, data_dir: str = "/data", total_acceptors: int = 3):
+    def __init__(self, acceptor_id: str, data_dir: str = "/data", total_acceptors: int = 3,
+                 sync_mode: str = SYNC_FDATASYNC,
+                 learner_hosts: Optional[List[Tuple[str, int]]] = None):
         """Initialize Acceptor instance."""
         self.acceptor_id = acceptor_id
+        self.learner_hosts = learner_hosts or []
         self.data_dir = f"{data_dir}/acceptor{acceptor_id}"
-        self.state_file = f"{self.data_dir}/state.json"
+        self.state_file = f"{self.data_dir}/state.msgpack"
+        self.legacy_state_file = f"{self.data_dir}/state.json"  # Snapshot format before msgpack
+        self.log_file = f"{self.data_dir}/state.log"
         self.logger = setup_logger(f"acceptor-{acceptor_id}")
         
         # Initialize state
         self.max_promised = 0
         self.max_accepted = 0
         self.accepted_value = None
-        self.log_proposals = {}  # proposal_number -> ProposalRecord
-        self.last_heartbeat_time = {}  # proposer_id -> timestamp
+        self.log_proposals = {}  # proposal_number (int) -> ProposalRecord, oldest first
+        self._dirty_proposals = set()  # log_proposals keys changed since the last log record
+        self.last_heartbeat_time = {}  # proposer_id -> time.monotonic_ns(), least recent first
         self.current_leader_id = None
         
+        # (proposal_number, proposer_id, tid, accepted_proposal, accepted_value, log_entry)
+        # of the latest promise, so a retried PREPARE can be answered without a log write
+        self._last_promise = None
+        
+        # Guards the state above; persistence happens outside it so that
+        # concurrent handlers can be batched into a single fsync
+        self._lock = threading.RLock()
+        
+        # Reused for every checkpoint instead of building a new dict
+        self._snapshot = {}
+        self._packer = msgpack.Packer(use_bin_type=True)
+        
+        # Transaction IDs only correlate one response; a per-boot prefix keeps
+        # them unique across restarts without a random UUID per request
+        self._tid_prefix = f"{acceptor_id}-{int(time.time() * 1000):x}"
+        self._tid_counter = itertools.count(1)
+        
+        # Handlers read the monotonic clock once and derive wall-clock
+        # timestamps from it; they drift from time.time() only if the
+        # system clock is stepped while the acceptor runs
+        self._wall_offset_ns = time.time_ns() - time.monotonic_ns()
+        
         # Load persistent state if available
         self._load_state()
+        self._commit_queue = _CommitQueue(self.log_file, self.state_file,
+                                          self._serialize_state, self.logger,
+                                          log_offset=self._log_end, sync_mode=sync_mode)
+        
+        # LEARN messages are sent by a background worker so learner round
+        # trips never hold up an ACCEPTED response
+        self._notify_q = queue.Queue(maxsize=10000)
+        
+        # Only the notify worker uses this, keeping one warm connection per learner
+        self._session = requests.Session()
+        self._session.mount('http://', HTTPAdapter(pool_connections=32, pool_maxsize=32))
+        self._notify_thread = threading.Thread(target=self._notify_loop)
+        self._notify_thread.daemon = True
+        self._notify_thread.start()
+        
+        # LEARNs held back because the proposer commits to the learners itself:
+        # proposal_number -> (monotonic deadline, LearnMessage), oldest first.
+        # Whatever the proposer hasn't reported committed by its deadline is
+        # broadcast as usual
+        self._held_learns = {}
+        self._held_lock = threading.Lock()
+        self._held_evt = threading.Event()  # Set when the first LEARN is held
+        self._fallback_thread = threading.Thread(target=self._fallback_loop)
+        self._fallback_thread.daemon = True
+        self._fallback_thread.start()
         
         self.logger.info(f"Acceptor {acceptor_id} initialized with max_promised={self.max_promised}, "
                          f"max_accepted={self.max_accepted}")
     
     def _load_state(self) -> None:
         """Load acceptor state from persistent storage."""
-        state = load_from_file(self.state_file)
+        state = self._load_snapshot()
         if state:
             self.max_promised = state.get('max_promised', 0)
             self.max_accepted = state.get('max_accepted', 0)
             self.accepted_value = state.get('accepted_value')
-            self.log_proposals = state.get('log_proposals', {})
+            self.log_proposals = _int_keys(state.get('log_proposals', {}))
             self.logger.info(f"Loaded state from {self.state_file}")
+        
+        # Replay changes logged since the last checkpoint
+        records, self._log_end = _read_log_records(self.log_file)
+        for record in records:
+            self._replay_record(record)
+        if records:
+            self.logger.info(f"Replayed {len(records)} records from {self.log_file}")
+        self._trim_history()
+    
+    def _load_snapshot(self) -> Optional[Dict[str, Any]]:
+        """Read the latest snapshot, falling back to a JSON one from an older version."""
+        if os.path.exists(self.state_file):
+            with open(self.state_file, 'rb') as f:
+                return _decode(f.read())
+        return load_from_file(self.legacy_state_file)
     
-    def _save_state(self) -> None:
-        """Save acceptor state to persistent storage."""
-        state = {
+    def _replay_record(self, record: Dict[str, Any]) -> None:
+        """Apply a write-ahead log record to the in-memory state."""
+        self.max_promised = max(self.max_promised, record['max_promised'])
+        self.max_accepted = record['max_accepted']
+        self.accepted_value = record['accepted_value']
+        self.log_proposals.update(_int_keys(record['log_proposals']))
+    
+    def _serialize_state(self) -> bytes:
+        """Serialize the current acceptor state."""
+        with self._lock:
+            state = self._snapshot
+            state['max_promised'] = self.max_promised
+            state['max_accepted'] = self.max_accepted
+            state['accepted_value'] = self.accepted_value
+            state['log_proposals'] = self.log_proposals
+            return self._packer.pack(state)
+    
+    def _log_state_change(self) -> list:
+        """Log the current header fields plus the proposal records changed since the last record.
+        
+        Called with the state lock held; returns the ticket to pass to _save_state.
+        """
+        record = {
             'max_promised': self.max_promised,
             'max_accepted': self.max_accepted,
             'accepted_value': self.accepted_value,
-            'log_proposals': self.log_proposals
+            'log_proposals': {key: self.log_proposals[key] for key in self._dirty_proposals}
         }
-        success = save_to_file(state, self.state_file)
+        self._dirty_proposals.clear()
+        return self._commit_queue.append(record)
+    
+    def _save_state(self, entry: list) -> None:
+        """Wait for a logged state change to reach persistent storage.
+        
+        Must be called without holding the state lock so concurrent
+        handlers can share the same sync.
+        """
+        success = self._commit_queue.wait(entry)
         if success:
-            self.logger.debug(f"Saved state to {self.state_file}")
+            self.logger.debug("Saved state to %s", self.log_file)
         else:
-            self.logger.error(f"Failed to save state to {self.state_file}")
+            self.logger.error(f"Failed to save state to {self.log_file}")
+    
+    def _wall_time(self, now: int) -> float:
+        """Convert a time.monotonic_ns() reading to wall-clock seconds."""
+        return (now + self._wall_offset_ns) / 1e9
+    
+    def _wall_time_ns(self, now: int) -> int:
+        """Convert a time.monotonic_ns() reading to wall-clock nanoseconds."""
+        return now + self._wall_offset_ns
+    
+    def _record_heartbeat(self, proposer_id: int, now: int) -> None:
+        """Note the time a proposer was last heard from, keeping the table small."""
+        # Re-inserting moves the proposer to the end, so the first key is the stalest
+        self.last_heartbeat_time.pop(proposer_id, None)
+        self.last_heartbeat_time[proposer_id] = now
+        if len(self.last_heartbeat_time) > _MAX_TRACKED_PROPOSERS:
+            del self.last_heartbeat_time[next(iter(self.last_heartbeat_time))]
+    
+    def _next_tid(self) -> str:
+        """Generate a unique transaction ID."""
+        return f"{self._tid_prefix}-{next(self._tid_counter)}"
     
-    def _create_proposal_record(self, proposal_number: int, tid: str) -> Dict[str, Any]:
+    def _create_proposal_record(self, proposal_number: int, tid: str, now: int) -> Dict[str, Any]:
         """Create a new proposal record."""
         return {
             'proposal_number': proposal_number,
             'tid': tid,
-            'promise_time': time.time(),
+            'promise_time': self._wall_time(now),
             'was_accepted': False,
             'accept_time': None,
             'value': None
         }
     
-    def _update_proposal_record(self, proposal_number: int, value: Any = None, 
+    def _trim_history(self) -> None:
+        """Drop the oldest proposal records beyond _MAX_PROPOSAL_HISTORY."""
+        while len(self.log_proposals) > _MAX_PROPOSAL_HISTORY:
+            oldest = next(iter(self.log_proposals))
+            del self.log_proposals[oldest]
+            self._dirty_proposals.discard(oldest)
+    
+    def _update_proposal_record(self, proposal_number: int, now: int, value: Any = None, 
                                was_accepted: bool = False) -> None:
         """Update an existing proposal record."""
-        if str(proposal_number) in self.log_proposals:
-            record = self.log_proposals[str(proposal_number)]
+        if proposal_number in self.log_proposals:
+            record = self.log_proposals[proposal_number]
             if was_accepted:
                 record['was_accepted'] = True
-                record['accept_time'] = time.time()
+                record['accept_time'] = self._wall_time(now)
                 record['value'] = value
-                self.log_proposals[str(proposal_number)] = record
+                self.log_proposals[proposal_number] = record
+                self._dirty_proposals.add(proposal_number)
     
     def handle_prepare(self, prepare_msg: PrepareMessage) -> Dict[str, Any]:
         """Handle prepare message from proposer."""
-        proposal_number = prepare_msg.proposal_number
-        proposer_id = prepare_msg.proposer_id
+        return self._prepare(prepare_msg.proposal_number, prepare_msg.proposer_id)
+    
+    def handle_prepare_dict(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Handle a prepare request straight from its parsed JSON body."""
+        return self._prepare(data['proposal_number'], data['proposer_id'])
+    
+    def _prepare(self, proposal_number: int, proposer_id: str) -> Dict[str, Any]:
+        """Promise a proposal number unless a higher one was already promised."""
+        now = time.monotonic_ns()
         
-        self.logger.info(f"Received PREPARE({proposal_number}) from proposer {proposer_id}")
+        self.logger.debug("Received PREPARE(%s) from proposer %s", proposal_number, proposer_id)
         
-        # Record heartbeat time for this proposer
-        self.last_heartbeat_time[proposer_id] = time.time()
+        with self._lock:
+            # Record heartbeat time for this proposer
+            self._record_heartbeat(proposer_id, now)
+            
+            promise = self._last_promise
+            is_retry = (promise is not None and promise[0] == proposal_number and
+                        promise[1] == proposer_id and self.max_promised == proposal_number)
         
-        # Generate a unique transaction ID
-        tid = str(uuid.uuid4())
+        if is_retry:
+            return self._repeat_promise(promise, now)
         
-        # Check if we can promise
-        if proposal_number > self.max_promised:
+        with self._lock:
+            # Generate a unique transaction ID
+            tid = self._next_tid()
+            
+            # Check if we can promise
+            if proposal_number <= self.max_promised:
+                # Cannot promise, send rejection
+                not_promise_msg = NotPromiseMessage(
+                    type=NOT_PROMISE,
+                    promised_proposal=self.max_promised,
+                    tid=tid,
+                    timestamp=self._wall_time_ns(now)
+                )
+                
+                self.logger.debug("Sending NOT_PROMISE for proposal %s (max_promised=%s)",
+                                  proposal_number, self.max_promised)
+                return not_promise_msg.to_dict()
+            
             # Create proposal record
-            self.log_proposals[str(proposal_number)] = self._create_proposal_record(
-                proposal_number, tid
+            self.log_proposals[proposal_number] = self._create_proposal_record(
+                proposal_number, tid, now
             )
+            self._dirty_proposals.add(proposal_number)
+            self._trim_history()
             
             # Update max_promised
             old_max_promised = self.max_promised
             self.max_promised = proposal_number
             
-            # Persist state before responding
-            self._save_state()
-            
-            # Create promise response
-            promise_msg = PromiseMessage(
-                type=PROMISE,
-                proposal_number=proposal_number,
-                accepted_proposal=self.max_accepted if self.max_accepted > 0 else None,
-                accepted_value=self.accepted_value,
-                tid=tid
-            )
-            
-            self.logger.info(f"Sending PROMISE for proposal {proposal_number} "
-                            f"(old max_promised={old_max_promised})")
-            return promise_msg.to_dict()
-        else:
-            # Cannot promise, send rejection
-            not_promise_msg = NotPromiseMessage(
-                type=NOT_PROMISE,
-                promised_proposal=self.max_promised,
-                tid=tid
-            )
+            # Log the change; it is made durable before responding
+            log_entry = self._log_state_change()
             
-            self.logger.info(f"Sending NOT_PROMISE for proposal {proposal_number} "
-                            f"(max_promised={self.max_promised})")
-            return not_promise_msg.to_dict()
+            accepted_proposal = self.max_accepted if self.max_accepted > 0 else None
+            accepted_value = self.accepted_value
+            self._last_promise = (proposal_number, proposer_id, tid,
+                                  accepted_proposal, accepted_value, log_entry)
+        
+        # Create promise response while the log write is in flight
+        promise_msg = PromiseMessage(
+            type=PROMISE,
+            proposal_number=proposal_number,
+            accepted_proposal=accepted_proposal,
+            accepted_value=accepted_value,
+            tid=tid,
+            timestamp=self._wall_time_ns(now)
+        )
+        response = promise_msg.to_dict()
+        
+        # Persist state before responding
+        self._save_state(log_entry)
+        
+        self.logger.debug("Sending PROMISE for proposal %s (old max_promised=%s)",
+                          proposal_number, old_max_promised)
+        return response
+    
+    def _repeat_promise(self, promise: tuple, now: int) -> Dict[str, Any]:
+        """Answer a retried PREPARE with the promise already made for it."""
+        proposal_number, _, tid, accepted_proposal, accepted_value, log_entry = promise
+        
+        promise_msg = PromiseMessage(
+            type=PROMISE,
+            proposal_number=proposal_number,
+            accepted_proposal=accepted_proposal,
+            accepted_value=accepted_value,
+            tid=tid,
+            timestamp=self._wall_time_ns(now)
+        )
+        response = promise_msg.to_dict()
+        
+        # The original promise may still be on its way to disk
+        self._save_state(log_entry)
+        
+        self.logger.debug("Repeating PROMISE for retried proposal %s", proposal_number)
+        return response
     
     def handle_accept(self, accept_msg: AcceptMessage) -> Dict[str, Any]:
         """Handle accept message from proposer."""
-        proposal_number = accept_msg.proposal_number
-        value = accept_msg.value
-        proposer_id = accept_msg.proposer_id
-        
-        self.logger.info(f"Received ACCEPT({proposal_number}, {value}) from proposer {proposer_id}")
+        return self._accept(accept_msg.proposal_number, accept_msg.value, accept_msg.proposer_id,
+                            accept_msg.commit_target, accept_msg.committed)
+    
+    def handle_accept_dict(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Handle an accept request straight from its parsed JSON body."""
+        return self._accept(data['proposal_number'], data['value'], data['proposer_id'],
+                            data.get('commit_target'), data.get('committed'))
+    
+    def _accept(self, proposal_number: int, value: Any, proposer_id: str,
+                commit_target: Optional[str] = None,
+                committed: Optional[List[int]] = None) -> Dict[str, Any]:
+        """Accept a proposal unless a higher number was promised."""
+        now = time.monotonic_ns()
         
-        # Record heartbeat time for this proposer
-        self.last_heartbeat_time[proposer_id] = time.time()
+        self.logger.debug("Received ACCEPT(%s, %s) from proposer %s", proposal_number, value, proposer_id)
         
-        # Generate a unique transaction ID
-        tid = str(uuid.uuid4())
+        # The learners already have these from the proposer
+        if committed:
+            self._release_learns(committed)
         
-        # Check if we can accept
-        if proposal_number >= self.max_promised:
+        with self._lock:
+            # Record heartbeat time for this proposer
+            self._record_heartbeat(proposer_id, now)
+            
+            # Generate a unique transaction ID
+            tid = self._next_tid()
+            
+            # Check if we can accept
+            if proposal_number < self.max_promised:
+                # Cannot accept, send rejection
+                not_accepted_msg = NotAcceptedMessage(
+                    type=NOT_ACCEPTED,
+                    promised_proposal=self.max_promised,
+                    tid=tid,
+                    timestamp=self._wall_time_ns(now)
+                )
+                
+                self.logger.debug("Sending NOT_ACCEPTED for proposal %s (max_promised=%s)",
+                                  proposal_number, self.max_promised)
+                return not_accepted_msg.to_dict()
+            
             # Update state
             self.max_promised = proposal_number
             self.max_accepted = proposal_number
             self.accepted_value = value
+            self._last_promise = None  # Its accepted value is stale now
             
             # Update proposal record if exists
-            self._update_proposal_record(proposal_number, value, True)
+            self._update_proposal_record(proposal_number, now, value, True)
             
-            # Persist state before responding
-            self._save_state()
-            
-            # Create accepted response
-            accepted_msg = AcceptedMessage(
-                type=ACCEPTED,
-                proposal_number=proposal_number,
-                value=value,
-                tid=tid
-            )
-            
-            self.logger.info(f"Sending ACCEPTED for proposal {proposal_number}")
-            
-            # Notify learners about the accepted value
-            self._notify_learners(proposal_number, value, tid)
-            
-            return accepted_msg.to_dict()
-        else:
-            # Cannot accept, send rejection
-            not_accepted_msg = NotAcceptedMessage(
-                type=NOT_ACCEPTED,
-                promised_proposal=self.max_promised,
-                tid=tid
-            )
-            
-            self.logger.info(f"Sending NOT_ACCEPTED for proposal {proposal_number} "
-                            f"(max_promised={self.max_promised})")
-            return not_accepted_msg.to_dict()
+            # Log the change; it is made durable before responding
+            log_entry = self._log_state_change()
+        
+        # Create accepted response while the log write is in flight
+        timestamp = self._wall_time_ns(now)
+        accepted_msg = AcceptedMessage(
+            type=ACCEPTED,
+            proposal_number=proposal_number,
+            value=value,
+            tid=tid,
+            timestamp=timestamp
+        )
+        response = accepted_msg.to_dict()
+        
+        # Persist state before responding
+        self._save_state(log_entry)
+        
+        self.logger.debug("Sending ACCEPTED for proposal %s", proposal_number)
+        
+        # Notify learners about the accepted value, unless the proposer will
+        self._notify_learners(proposal_number, value, tid, timestamp, hold=commit_target is not None)
+        
+        return response
     
     def handle_heartbeat(self, heartbeat_msg: HeartbeatMessage) -> Dict[str, Any]:
         """Handle heartbeat message from proposer."""
-        leader_id = heartbeat_msg.leader_id
-        sequence_number = heartbeat_msg.sequence_number
+        return self._heartbeat(heartbeat_msg.leader_id, heartbeat_msg.sequence_number,
+                               heartbeat_msg.committed)
+    
+    def handle_heartbeat_dict(self, data: Dict[str, Any]) -> Dict[str, Any]:
+        """Handle a heartbeat straight from its parsed JSON body."""
+        return self._heartbeat(data['leader_id'], data['sequence_number'], data.get('committed'))
+    
+    def handle_heartbeat_lite(self, leader_id: str, sequence_number: int,
+                              committed: Optional[List[int]] = None) -> None:
+        """Handle a lite heartbeat; same bookkeeping, no ack built."""
+        self._heartbeat(leader_id, sequence_number, committed)
+    
+    def _heartbeat(self, leader_id: str, sequence_number: int,
+                   committed: Optional[List[int]] = None) -> Dict[str, Any]:
+        """Record the current leader and acknowledge its heartbeat."""
+        now = time.monotonic_ns()
+        
+        self.logger.debug("Received HEARTBEAT from leader %s with sequence number %s",
+                          leader_id, sequence_number)
         
-        self.logger.debug(f"Received HEARTBEAT from leader {leader_id} "
-                         f"with sequence number {sequence_number}")
+        # Commits reported while no ACCEPT was going out
+        if committed:
+            self._release_learns(committed)
         
         # Update leader information
-        self.current_leader_id = leader_id
-        self.last_heartbeat_time[leader_id] = time.time()
+        with self._lock:
+            self.current_leader_id = leader_id
+            self._record_heartbeat(leader_id, now)
         
         # Simple ACK response
         return {
             "type": "HEARTBEAT_ACK",
             "acceptor_id": self.acceptor_id,
-            "timestamp": time.time()
+            "timestamp": self._wall_time_ns(now)
         }
     
-    def _notify_learners(self, proposal_number: int, value: Any, tid: str) -> None:
-        """Notify learners about accepted value."""
-        # In a real implementation, this would send notifications to the learners
-        # For demonstration, we'll just log the notification
-        self.logger.info(f"Would notify learners: LEARN({proposal_number}, {value})")
+    def _notify_learners(self, proposal_number: int, value: Any, tid: str,
+                         timestamp: int, hold: bool = False) -> None:
+        """Queue a LEARN message about an accepted value for the learners."""
+        if not self.learner_hosts:
+            return
         
-        # Actual implementation would use configuration to know learner endpoints
-        # and send actual HTTP requests or use a message queue
         learn_msg = LearnMessage(
             type=LEARN,
             proposal_number=proposal_number,
             value=value,
             acceptor_id=self.acceptor_id,
-            tid=tid
+            tid=tid,
+            timestamp=timestamp
         )
         
-        # Placeholder for actual notification logic
-        # self._send_to_learners(learn_msg.to_dict())
+        if hold:
+            deadline = time.monotonic() + COMMIT_FALLBACK_MS / 1000.0
+            with self._held_lock:
+                # Re-inserted so the dict stays in deadline order
+                self._held_learns.pop(proposal_number, None)
+                self._held_learns[proposal_number] = (deadline, learn_msg)
+            self._held_evt.set()
+            return
+        
+        self._queue_learn(learn_msg)
+    
+    def _queue_learn(self, learn_msg: LearnMessage,
+                     hosts: Optional[Tuple[Tuple[str, int], ...]] = None) -> None:
+        """Hand a LEARN to the notify worker, for `hosts` or every learner."""
+        proposal_number = learn_msg.proposal_number
+        try:
+            self._notify_q.put_nowait((learn_msg, hosts))
+        except queue.Full:
+            self.logger.warning(f"Notification queue full, dropping LEARN({proposal_number})")
+    
+    def _release_learns(self, committed: List[Any]) -> None:
+        """Drop held LEARNs for proposals the proposer has committed.
+        
+        A report is a proposal number once every learner acknowledged the
+        COMMIT, or [proposal_number, acked learners as "host:port"] when some
+        did not; those others get the LEARN straight away.
+        """
+        partial = []
+        with self._held_lock:
+            for report in committed:
+                if isinstance(report, int):
+                    self._held_learns.pop(report, None)
+                    continue
+                proposal_number, acked = report
+                held = self._held_learns.pop(proposal_number, None)
+                if held is not None:
+                    partial.append((held[1], set(acked)))
+        
+        for learn_msg, acked in partial:
+            # Learners are named as in the proposer's LEARNER_HOSTS; one we
+            # can't match is sent to, so a mismatch only costs a duplicate
+            hosts = tuple((host, port) for host, port in self.learner_hosts
+                          if f"{host}:{port}" not in acked)
+            if hosts:
+                self._queue_learn(learn_msg, hosts)
+    
+    def _fallback_loop(self) -> None:
+        """Broadcast held LEARNs whose commit the proposer didn't report in time."""
+        while True:
+            expired = []
+            with self._held_lock:
+                now = time.monotonic()
+                # Every LEARN is held for the same time, so the oldest expires first
+                for proposal_number, (deadline, learn_msg) in self._held_learns.items():
+                    if deadline > now:
+                        break
+                    expired.append(learn_msg)
+                for learn_msg in expired:
+                    del self._held_learns[learn_msg.proposal_number]
+                wait = None
+                if self._held_learns:
+                    wait = next(iter(self._held_learns.values()))[0] - now
+            
+            for learn_msg in expired:
+                self.logger.debug("No commit reported for proposal %s, sending LEARN",
+                                  learn_msg.proposal_number)
+                self._queue_learn(learn_msg)
+            
+            if wait is None:
+                self._held_evt.wait()
+                self._held_evt.clear()
+            else:
+                time.sleep(wait)
+    
+    def _notify_loop(self) -> None:
+        """Send queued LEARN messages to the learners, batching any that pile up."""
+        while True:
+            items = [self._notify_q.get()]
+            
+            # Linger briefly so a burst of accepts goes out as one request
+            deadline = time.monotonic() + MAX_BATCH_MS / 1000.0
+            while len(items) < MAX_BATCH:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    items.append(self._notify_q.get(timeout=remaining))
+                except queue.Empty:
+                    break
+            
+            # One request per set of recipients; almost always just "all"
+            batches = {}
+            for learn_msg, hosts in items:
+                batches.setdefault(hosts, []).append(learn_msg)
+            
+            for hosts, learn_msgs in batches.items():
+                # A single LEARN and a batch share one encoding
+                data = pack_learns([learn_msg.to_dict() for learn_msg in learn_msgs])
+                if len(learn_msgs) == 1:
+                    label = f"LEARN({learn_msgs[0].proposal_number})"
+                else:
+                    label = f"batch of {len(learn_msgs)} LEARNs"
+                self._send_to_learners(data, label, hosts)
     
-    def _send_to_learners(self, message: Dict[str, Any]) -> None:
-        """Send message to all learners."""
-        # This would be implemented to send HTTP requests or use message queues
-        # to send the message to all configured learners
-        pass
+    def _send_to_learners(self, data: bytes, label: str,
+                          hosts: Optional[Tuple[Tuple[str, int], ...]] = None) -> None:
+        """Send encoded LEARN frames to `hosts`, or to all learners."""
+        for host, port in hosts or self.learner_hosts:
+            url = f"http://{host}:{port}/learn"
+            try:
+                self._session.post(url, data=data, headers=LEARN_HEADERS, timeout=2)
+            except Exception as e:
+                self.logger.warning(f"Failed to send {label} to learner at {host}:{port}: {e}")
@@ -4,91 +4,104 @@ Main entry point for Acceptor service.
 
 import os
 import json
-from flask import Flask, request, jsonify
+import orjson
+from flask import Flask, Response, request
+from waitress import serve
 
 from acceptor import Acceptor
-from common.message import (
-    PrepareMessage, AcceptMessage, HeartbeatMessage
+from common.utils import (
+    setup_logger, parse_hosts, pack_message, unpack_message, unpack_heartbeat_lite,
+    MSGPACK_MIMETYPE
 )
-from common.constants import PREPARE, ACCEPT, HEARTBEAT
-from common.utils import setup_logger
 
 # Get environment variables
 ACCEPTOR_ID = os.environ.get('ACCEPTOR_ID', '1')
 ACCEPTOR_PORT = int(os.environ.get('ACCEPTOR_PORT', 5001))
 TOTAL_ACCEPTORS = int(os.environ.get('TOTAL_ACCEPTORS', 3))
 DATA_DIR = os.environ.get('DATA_DIR', '/data')
+SYNC_MODE = os.environ.get('SYNC_MODE', 'fdatasync')  # or 'sync_file_range'
+SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 16))
+LEARNER_HOSTS_STR = os.environ.get('LEARNER_HOSTS', '')  # e.g. learner1:7001,learner2:7002
+
+# Parse hosts
+LEARNER_HOSTS = parse_hosts(LEARNER_HOSTS_STR)
 
 # Set up Flask application
 app = Flask(__name__)
 logger = setup_logger(f"acceptor-{ACCEPTOR_ID}-api")
 
 # Initialize acceptor instance
-acceptor = Acceptor(ACCEPTOR_ID, DATA_DIR, TOTAL_ACCEPTORS)
+acceptor = Acceptor(ACCEPTOR_ID, DATA_DIR, TOTAL_ACCEPTORS, SYNC_MODE, LEARNER_HOSTS)
+
+def read_message():
+    """Parse a msgpack or JSON request body."""
+    return unpack_message(request.get_data(cache=False), request.content_type)
+
+def json_response(payload, status=200):
+    """Build a JSON response with orjson instead of jsonify."""
+    return Response(orjson.dumps(payload), status=status, mimetype='application/json')
+
+def message_response(payload, status=200):
+    """Reply in the same encoding the request body used."""
+    if request.content_type and request.content_type.startswith(MSGPACK_MIMETYPE):
+        return Response(pack_message(payload), status=status, mimetype=MSGPACK_MIMETYPE)
+    return json_response(payload, status)
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
-    return jsonify({"status": "ok", "acceptor_id": ACCEPTOR_ID})
+    return json_response({"status": "ok", "acceptor_id": ACCEPTOR_ID})
 
 @app.route('/prepare', methods=['POST'])
 def prepare():
     """Handle prepare requests."""
     try:
-        data = request.json
-        logger.debug(f"Received prepare request: {data}")
-        
-        prepare_msg = PrepareMessage(
-            type=PREPARE,
-            proposal_number=data['proposal_number'],
-            proposer_id=data['proposer_id']
-        )
+        data = read_message()
+        logger.debug("Received prepare request: %s", data)
         
-        response = acceptor.handle_prepare(prepare_msg)
-        return jsonify(response)
+        response = acceptor.handle_prepare_dict(data)
+        return message_response(response)
     except Exception as e:
         logger.error(f"Error handling prepare request: {e}")
-        return jsonify({"error": str(e)}), 500
+        return message_response({"error": str(e)}, 500)
 
 @app.route('/accept', methods=['POST'])
 def accept():
     """Handle accept requests."""
     try:
-        data = request.json
-        logger.debug(f"Received accept request: {data}")
+        data = read_message()
+        logger.debug("Received accept request: %s", data)
         
-        accept_msg = AcceptMessage(
-            type=ACCEPT,
-            proposal_number=data['proposal_number'],
-            value=data['value'],
-            proposer_id=data['proposer_id']
-        )
-        
-        response = acceptor.handle_accept(accept_msg)
-        return jsonify(response)
+        response = acceptor.handle_accept_dict(data)
+        return message_response(response)
     except Exception as e:
         logger.error(f"Error handling accept request: {e}")
-        return jsonify({"error": str(e)}), 500
+        return message_response({"error": str(e)}, 500)
 
 @app.route('/heartbeat', methods=['POST'])
 def heartbeat():
     """Handle heartbeat messages."""
     try:
-        data = request.json
-        logger.debug(f"Received heartbeat: {data}")
-        
-        heartbeat_msg = HeartbeatMessage(
-            type=HEARTBEAT,
-            leader_id=data['leader_id'],
-            sequence_number=data['sequence_number'],
-            timestamp=data['timestamp']
-        )
+        data = read_message()
+        logger.debug("Received heartbeat: %s", data)
         
-        response = acceptor.handle_heartbeat(heartbeat_msg)
-        return jsonify(response)
+        response = acceptor.handle_heartbeat_dict(data)
+        return message_response(response)
     except Exception as e:
         logger.error(f"Error handling heartbeat: {e}")
-        return jsonify({"error": str(e)}), 500
+        return message_response({"error": str(e)}, 500)
+
+@app.route('/heartbeat_lite', methods=['POST'])
+def heartbeat_lite():
+    """Handle a steady-state heartbeat carrying only the leader and sequence."""
+    try:
+        leader_id, sequence_number, committed = unpack_heartbeat_lite(request.get_data(cache=False))
+        acceptor.handle_heartbeat_lite(leader_id, sequence_number, committed)
+        # The leader doesn't read heartbeat acks, so none is sent back
+        return Response(status=204)
+    except Exception as e:
+        logger.error(f"Error handling lite heartbeat: {e}")
+        return message_response({"error": str(e)}, 500)
 
 @app.route('/status', methods=['GET'])
 def status():
@@ -101,11 +114,14 @@ def status():
             "has_accepted_value": acceptor.accepted_value is not None,
             "current_leader": acceptor.current_leader_id
         }
-        return jsonify(status_info)
+        return json_response(status_info)
     except Exception as e:
         logger.error(f"Error getting status: {e}")
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}, 500)
 
 if __name__ == '__main__':
     logger.info(f"Starting Acceptor {ACCEPTOR_ID} on port {ACCEPTOR_PORT}")
-    app.run(host='0.0.0.0', port=ACCEPTOR_PORT, debug=False)
+    # Threaded WSGI server so concurrent prepare/accept requests overlap
+    # and share group commits; one process keeps a single acceptor state
+    setup_logger('waitress')
+    serve(app, host='0.0.0.0', port=ACCEPTOR_PORT, threads=SERVER_THREADS)
@@ -6,12 +6,18 @@ import os
 import time
 import json
 import uuid
+import heapq
+import itertools
 import random
 import threading
 from typing import Dict, Any, List, Optional, Tuple
-from collections import defaultdict
+from collections import defaultdict, deque, OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 
+import orjson
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from common.constants import (
     WRITE_REQUEST, READ_REQUEST, STATUS_REQUEST,
@@ -21,7 +27,36 @@ from common.constants import (
 from common.message import (
     WriteRequestMessage, ReadRequestMessage, StatusRequestMessage
 )
-from common.utils import setup_logger, parse_hosts, generate_request_id, calculate_backoff
+from common.utils import setup_logger, parse_hosts, decorrelated_backoff
+
+
+# Headers for request bodies that are already JSON-encoded
+_JSON_HEADERS = {'Content-Type': 'application/json'}
+
+
+def _parse_json(response: requests.Response) -> Any:
+    """Parse a JSON response body straight from bytes with orjson."""
+    try:
+        return orjson.loads(response.content)
+    except orjson.JSONDecodeError:
+        # orjson only takes UTF-8; let requests handle other encodings
+        return response.json()
+
+
+class BoundedDict(OrderedDict):
+    """Dict that keeps at most `maxlen` entries, dropping the least recently set."""
+    
+    def __init__(self, maxlen: int):
+        """Initialize an empty BoundedDict."""
+        super().__init__()
+        self.maxlen = maxlen
+    
+    def __setitem__(self, key, value):
+        """Set an entry and evict the oldest ones beyond `maxlen`."""
+        super().__setitem__(key, value)
+        self.move_to_end(key)
+        while len(self) > self.maxlen:
+            self.popitem(last=False)
 
 
 class PaxosClient:
@@ -34,16 +69,68 @@ class PaxosClient:
         self.proposer_hosts = proposer_hosts
         self.learner_hosts = learner_hosts
         
+        # Endpoint URLs per node, built once instead of on every request
+        self.proposer_urls = {
+            (host, port): {endpoint: f"http://{host}:{port}/{endpoint}"
+                           for endpoint in ('request', 'status')}
+            for host, port in proposer_hosts
+        }
+        self.learner_urls = {
+            (host, port): {endpoint: f"http://{host}:{port}/{endpoint}"
+                           for endpoint in ('read', 'subscribe', 'unsubscribe')}
+            for host, port in learner_hosts
+        }
+        
         self.logger = setup_logger(f"client-{client_id}")
         
+        # One pooled session for all calls so connections to each node are kept alive.
+        # Failed connects and gateway errors are retried inline; a request that may
+        # have reached the node (read error) is left to the retry thread
+        self.session = requests.Session()
+        self.session.mount('http://', HTTPAdapter(
+            pool_connections=max(len(proposer_hosts) + len(learner_hosts), 1),
+            pool_maxsize=64,
+            max_retries=Retry(
+                total=2, connect=2, read=0, status=2,
+                backoff_factor=0.1,
+                status_forcelist=(502, 503, 504),
+                allowed_methods=frozenset(['GET', 'POST']),
+                raise_on_status=False
+            )
+        ))
+        
+        # Proposers are probed concurrently during leader discovery
+        self._probe_pool = ThreadPoolExecutor(max_workers=max(min(8, len(proposer_hosts)), 1),
+                                              thread_name_prefix=f"client-{client_id}-probe")
+        
+        # Guards known_nodes, the leader fields, pending_requests and retry_queue,
+        # which the retry thread and API threads use concurrently; never held across I/O
+        self._state_lock = threading.RLock()
+        
         # Track known nodes and leader
-        self.known_nodes = {}  # node_id -> NodeInfo
+        self.known_nodes = BoundedDict(256)  # node_id -> NodeInfo
         self.current_leader = None
+        self._leader_addr_cache = None  # (host, port) of current_leader once resolved
         
         # Track pending requests
-        self.pending_requests = {}  # request_id -> RequestMetadata
-        self.response_cache = {}  # request_id -> response
-        self.retry_queue = []
+        self.pending_requests = BoundedDict(8192)  # request_id -> RequestMetadata
+        self.response_cache = BoundedDict(4096)  # request_id -> response
+        self.retry_queue = deque()
+        
+        # (next_retry_time, request_id) deadlines; entries whose time no longer
+        # matches the request's metadata are stale and skipped
+        self._retry_heap = []
+        self._retry_cv = threading.Condition()
+        
+        # Request IDs only need to be unique per client; a per-boot prefix keeps
+        # them unique across restarts without hashing every operation
+        self._request_prefix = f"{client_id}-{int(time.time() * 1000):x}"
+        self._req_counter = itertools.count(1)
+        
+        # Reads being sent, keyed by (key, consistency), that identical
+        # concurrent reads wait on instead of sending their own
+        self._inflight = {}
+        self._inflight_lock = threading.Lock()
         
         # Track highest seen sequence
         self.highest_seen_sequence = 0
@@ -65,59 +152,93 @@ class PaxosClient:
     def stop(self):
         """Stop the client background threads."""
         self.stop_threads = True
+        with self._retry_cv:
+            self._retry_cv.notify()
         self.retry_thread.join(timeout=2)
+        self._probe_pool.shutdown(wait=False)
+        self.session.close()
         self.logger.info("Client stopped")
     
     def _discover_leader(self) -> None:
         """Discover the current leader by querying proposers."""
-        for host, port in self.proposer_hosts:
-            try:
-                url = f"http://{host}:{port}/status"
-                response = requests.get(url, timeout=3)
+        probes = {
+            self._probe_pool.submit(self._probe_proposer, host, port): (host, port)
+            for host, port in self.proposer_hosts
+        }
+        
+        try:
+            # Take answers in arrival order so dead proposers don't hold up discovery
+            for probe in as_completed(probes):
+                host, port = probes[probe]
+                try:
+                    status_data = probe.result()
+                except Exception as e:
+                    self.logger.warning(f"Failed to query proposer at {host}:{port}: {e}")
+                    continue
                 
-                if response.status_code == 200:
-                    status_data = response.json()
-                    
-                    # Update node info
-                    node_id = status_data.get('proposer_id')
+                if status_data is None:
+                    continue
+                
+                # Update node info
+                node_id = status_data.get('proposer_id')
+                with self._state_lock:
                     self.known_nodes[node_id] = {
                         'node_id': node_id,
                         'roles': ['proposer'],
                         'address': f"{host}:{port}",
+                        'address_tuple': (host, port),
                         'last_success': time.time(),
                         'failure_count': 0
                     }
-                    
-                    # Check if this is the leader
-                    is_leader = status_data.get('state') == 'LEADER'
-                    if is_leader:
-                        self.current_leader = node_id
-                        self.logger.info(f"Discovered leader: {node_id} at {host}:{port}")
-                        return
-                    
-                    # If not leader, check if it knows the leader
-                    leader_id = status_data.get('leader_id')
-                    if leader_id:
-                        self.current_leader = leader_id
-                        self.logger.info(f"Discovered leader: {leader_id} (reported by {node_id})")
-                        return
-            except Exception as e:
-                self.logger.warning(f"Failed to query proposer at {host}:{port}: {e}")
+                
+                # Check if this is the leader
+                is_leader = status_data.get('state') == 'LEADER'
+                if is_leader:
+                    self._set_leader(node_id)
+                    self.logger.info(f"Discovered leader: {node_id} at {host}:{port}")
+                    return
+                
+                # If not leader, check if it knows the leader
+                leader_id = status_data.get('leader_id')
+                if leader_id:
+                    self._set_leader(leader_id)
+                    self.logger.info(f"Discovered leader: {leader_id} (reported by {node_id})")
+                    return
+        finally:
+            # Probes still queued are no longer needed
+            for probe in probes:
+                probe.cancel()
         
         self.logger.warning("Could not discover a leader")
     
+    def _probe_proposer(self, host: str, port: int) -> Optional[Dict[str, Any]]:
+        """Fetch a proposer's status, or None if it did not answer with 200."""
+        url = self.proposer_urls[(host, port)]['status']
+        response = self.session.get(url, timeout=3)
+        if response.status_code == 200:
+            return _parse_json(response)
+        return None
+    
+    def _set_leader(self, leader_id: str) -> None:
+        """Record the current leader and resolve its address once."""
+        with self._state_lock:
+            self.current_leader = leader_id
+            leader_info = self.known_nodes.get(leader_id)
+            self._leader_addr_cache = leader_info['address_tuple'] if leader_info else None
+    
     def _get_leader_address(self) -> Optional[Tuple[str, int]]:
         """Get the address of the current leader."""
-        if not self.current_leader:
-            return None
-        
-        leader_info = self.known_nodes.get(self.current_leader)
-        if not leader_info:
-            return None
-        
-        address = leader_info['address']
-        host, port_str = address.split(':')
-        return (host, int(port_str))
+        with self._state_lock:
+            if self._leader_addr_cache is None and self.current_leader:
+                # The leader was named before we had its address; try again now
+                leader_info = self.known_nodes.get(self.current_leader)
+                if leader_info:
+                    self._leader_addr_cache = leader_info['address_tuple']
+            return self._leader_addr_cache
+    
+    def _new_request_id(self) -> str:
+        """Generate a unique request ID."""
+        return f"{self._request_prefix}-{next(self._req_counter)}"
     
     def _get_random_proposer(self) -> Tuple[str, int]:
         """Get a random proposer address."""
@@ -128,42 +249,97 @@ class PaxosClient:
         return random.choice(self.learner_hosts)
     
     def _track_request(self, request_id: str, operation: Dict[str, Any], 
-                      target_node: Tuple[str, int]) -> None:
-        """Track a pending request."""
-        self.pending_requests[request_id] = {
-            'request_id': request_id,
-            'operation': operation,
-            'initial_timestamp': time.time(),
-            'attempt_count': 1,
-            'next_retry_time': time.time() + 5,  # First retry after 5 seconds
-            'target_node': target_node
-        }
+                      target_node: Tuple[str, int], payload: Optional[bytes] = None) -> None:
+        """Track a pending request along with its encoded body, if it has one."""
+        with self._state_lock:
+            metadata = self.pending_requests.get(request_id)
+            if metadata is not None:
+                # A retry keeps the attempt count and backoff of the original request
+                metadata['target_node'] = target_node
+                return
+            
+            # The first send may take up to its 5 second timeout, so never retry sooner
+            backoff = decorrelated_backoff(5.0, base=5.0)
+            next_retry_time = time.time() + backoff
+            self.pending_requests[request_id] = {
+                'request_id': request_id,
+                'operation': operation,
+                'initial_timestamp': time.time(),
+                'attempt_count': 1,
+                'last_backoff': backoff,
+                'next_retry_time': next_retry_time,
+                'target_node': target_node,
+                'payload': payload
+            }
+            self._schedule_retry(request_id, next_retry_time)
+    
+    def _cached_payload(self, request_id: str) -> Optional[bytes]:
+        """Return the encoded body a tracked request was first sent with."""
+        with self._state_lock:
+            metadata = self.pending_requests.get(request_id)
+            return metadata['payload'] if metadata else None
+    
+    def _schedule_retry(self, request_id: str, retry_time: float) -> None:
+        """Wake the retry thread at `retry_time` to check on a request."""
+        with self._retry_cv:
+            heapq.heappush(self._retry_heap, (retry_time, request_id))
+            if self._retry_heap[0][1] == request_id:
+                # New earliest deadline, the retry thread has to wake sooner
+                self._retry_cv.notify()
+    
+    def _next_due_retries(self) -> List[Tuple[float, str]]:
+        """Sleep until the earliest retry deadline and return every deadline that is due."""
+        with self._retry_cv:
+            while not self.stop_threads:
+                current_time = time.time()
+                if self._retry_heap and self._retry_heap[0][0] <= current_time:
+                    break
+                timeout = self._retry_heap[0][0] - current_time if self._retry_heap else None
+                self._retry_cv.wait(timeout)
+            
+            due = []
+            while self._retry_heap and self._retry_heap[0][0] <= time.time():
+                due.append(heapq.heappop(self._retry_heap))
+            return due
     
     def _process_retries(self) -> None:
         """Process retry queue in the background."""
         while not self.stop_threads:
             try:
+                due = self._next_due_retries()
                 current_time = time.time()
                 
-                # Check pending requests for timeouts
-                for request_id, metadata in list(self.pending_requests.items()):
-                    if current_time >= metadata['next_retry_time']:
+                # Check requests whose retry deadline has passed
+                for retry_time, request_id in due:
+                    with self._state_lock:
+                        metadata = self.pending_requests.get(request_id)
+                        if metadata is None or metadata['next_retry_time'] != retry_time:
+                            continue
+                        
                         self.logger.info(f"Request {request_id} timed out, queueing for retry")
                         self.retry_queue.append(request_id)
                         
-                        # Update next retry time with exponential backoff
+                        # Update next retry time with decorrelated jitter so that
+                        # requests that timed out together don't retry together
                         metadata['attempt_count'] += 1
-                        backoff = calculate_backoff(metadata['attempt_count'])
+                        backoff = decorrelated_backoff(metadata['last_backoff'])
+                        metadata['last_backoff'] = backoff
                         metadata['next_retry_time'] = current_time + backoff
+                        self._schedule_retry(request_id, metadata['next_retry_time'])
                 
                 # Process retry queue
-                if self.retry_queue:
-                    request_id = self.retry_queue.pop(0)
-                    if request_id in self.pending_requests:
-                        metadata = self.pending_requests[request_id]
-                        operation = metadata['operation']
-                        
-                        self.logger.info(f"Retrying request {request_id}, attempt {metadata['attempt_count']}")
+                while True:
+                    with self._state_lock:
+                        if not self.retry_queue:
+                            break
+                        request_id = self.retry_queue.popleft()
+                        metadata = self.pending_requests.get(request_id)
+                        if metadata is not None:
+                            operation = metadata['operation']
+                            attempt_count = metadata['attempt_count']
+                    
+                    if metadata is not None:
+                        self.logger.info(f"Retrying request {request_id}, attempt {attempt_count}")
                         
                         # Rediscover leader first
                         self._discover_leader()
@@ -177,20 +353,22 @@ class PaxosClient:
                             self._send_status_request(request_id)
                         
                         # If too many retries, give up
-                        if metadata['attempt_count'] >= 5:
+                        if attempt_count >= 5:
                             self.logger.warning(f"Giving up on request {request_id} after 5 attempts")
-                            self.pending_requests.pop(request_id, None)
-                
-                time.sleep(0.1)  # Check frequently but not constantly
+                            with self._state_lock:
+                                self.pending_requests.pop(request_id, None)
             except Exception as e:
                 self.logger.error(f"Error in retry processor: {e}")
-                time.sleep(1)  # Back off on error
+                # Back off on error, but wake at once if the client is stopped
+                with self._retry_cv:
+                    if not self.stop_threads:
+                        self._retry_cv.wait(1)
     
     def _handle_redirect(self, response: Dict[str, Any]) -> None:
         """Handle redirect response."""
         correct_leader = response.get('correct_leader')
         if correct_leader:
-            self.current_leader = correct_leader
+            self._set_leader(correct_leader)
             self.logger.info(f"Updated leader to {correct_leader}")
     
     def write(self, key: str, value: Any) -> Dict[str, Any]:
@@ -201,7 +379,7 @@ class PaxosClient:
             'value': value
         }
         
-        request_id = generate_request_id(self.client_id, operation)
+        request_id = self._new_request_id()
         
         # Track the request before sending
         operation_metadata = {
@@ -220,13 +398,16 @@ class PaxosClient:
                 'value': operation
             }
         
-        # Prepare write request message
-        write_request = WriteRequestMessage(
-            type=WRITE_REQUEST,
-            request_id=request_id,
-            client_id=self.client_id,
-            operation=operation
-        )
+        # Prepare write request message, or reuse the body of the first attempt
+        payload = self._cached_payload(request_id)
+        if payload is None:
+            write_request = WriteRequestMessage(
+                type=WRITE_REQUEST,
+                request_id=request_id,
+                client_id=self.client_id,
+                operation=operation
+            )
+            payload = orjson.dumps(write_request.to_dict())
         
         # Try to send to current leader first
         leader_address = self._get_leader_address()
@@ -239,16 +420,16 @@ class PaxosClient:
         target = (host, port)
         
         try:
-            url = f"http://{host}:{port}/request"
+            url = self.proposer_urls[target]['request']
             self.logger.info(f"Sending write request {request_id} to {host}:{port}")
             
             # Track the request
             if operation_metadata:
-                self._track_request(request_id, operation_metadata, target)
+                self._track_request(request_id, operation_metadata, target, payload)
             
             # Send the request
-            response = requests.post(url, json=write_request.to_dict(), timeout=5)
-            response_data = response.json()
+            response = self.session.post(url, data=payload, headers=_JSON_HEADERS, timeout=5)
+            response_data = _parse_json(response)
             
             # Handle response
             if response_data.get('type') == 'WRITE_ACKNOWLEDGMENT':
@@ -268,11 +449,38 @@ class PaxosClient:
     
     def read(self, key: str, consistency: str = "eventual") -> Dict[str, Any]:
         """Read a value by key from the system."""
+        if consistency == "strong":
+            # A strong read must not be answered by one that started before it
+            return self._read(key, consistency)
+        
+        inflight_key = (key, consistency)
+        with self._inflight_lock:
+            future = self._inflight.get(inflight_key)
+            is_owner = future is None
+            if is_owner:
+                future = self._inflight[inflight_key] = Future()
+        
+        if not is_owner:
+            return future.result()
+        
+        try:
+            response = self._read(key, consistency)
+            future.set_result(response)
+            return response
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                del self._inflight[inflight_key]
+    
+    def _read(self, key: str, consistency: str) -> Dict[str, Any]:
+        """Send a new read request for a key."""
         query = {
             'key': key
         }
         
-        request_id = generate_request_id(self.client_id, query)
+        request_id = self._new_request_id()
         
         # Track the request before sending
         operation_metadata = {
@@ -293,14 +501,17 @@ class PaxosClient:
                 'consistency': consistency
             }
         
-        # Prepare read request message
-        read_request = ReadRequestMessage(
-            type=READ_REQUEST,
-            request_id=request_id,
-            query=query,
-            consistency_level=consistency,
-            client_id=self.client_id
-        )
+        # Prepare read request message, or reuse the body of the first attempt
+        payload = self._cached_payload(request_id)
+        if payload is None:
+            read_request = ReadRequestMessage(
+                type=READ_REQUEST,
+                request_id=request_id,
+                query=query,
+                consistency_level=consistency,
+                client_id=self.client_id
+            )
+            payload = orjson.dumps(read_request.to_dict())
         
         # Choose target based on consistency level
         if consistency == "strong":
@@ -308,15 +519,14 @@ class PaxosClient:
             leader_address = self._get_leader_address()
             if leader_address:
                 host, port = leader_address
-                url = f"http://{host}:{port}/request"
             else:
                 # Fall back to random proposer
                 host, port = self._get_random_proposer()
-                url = f"http://{host}:{port}/request"
+            url = self.proposer_urls[(host, port)]['request']
         else:
             # Eventual or session consistency can go directly to learner
             host, port = self._get_random_learner()
-            url = f"http://{host}:{port}/read"
+            url = self.learner_urls[(host, port)]['read']
         
         target = (host, port)
         
@@ -325,23 +535,24 @@ class PaxosClient:
             
             # Track the request
             if operation_metadata:
-                self._track_request(request_id, operation_metadata, target)
+                self._track_request(request_id, operation_metadata, target, payload)
             
             # Send the request
-            response = requests.post(url, json=read_request.to_dict(), timeout=5)
-            response_data = response.json()
+            response = self.session.post(url, data=payload, headers=_JSON_HEADERS, timeout=5)
+            response_data = _parse_json(response)
             
             # Handle response
             if response_data.get('type') == 'READ_RESPONSE':
                 self.logger.info(f"Read request {request_id} completed")
                 
-                # Update highest seen sequence if this was a real result
-                sequence_number = response_data.get('sequence_number')
-                if sequence_number and sequence_number > self.highest_seen_sequence:
-                    self.highest_seen_sequence = sequence_number
-                
-                # Remove from pending
-                self.pending_requests.pop(request_id, None)
+                with self._state_lock:
+                    # Update highest seen sequence if this was a real result
+                    sequence_number = response_data.get('sequence_number')
+                    if sequence_number and sequence_number > self.highest_seen_sequence:
+                        self.highest_seen_sequence = sequence_number
+                    
+                    # Remove from pending
+                    self.pending_requests.pop(request_id, None)
                 
                 return response_data
             elif response_data.get('type') == REDIRECT:
@@ -358,7 +569,7 @@ class PaxosClient:
     
     def get_status(self) -> Dict[str, Any]:
         """Get status of the Paxos cluster."""
-        request_id = generate_request_id(self.client_id, {"type": "status"})
+        request_id = self._new_request_id()
         
         # Track the request before sending
         operation_metadata = {
@@ -396,7 +607,7 @@ class PaxosClient:
         target = (host, port)
         
         try:
-            url = f"http://{host}:{port}/status"
+            url = self.proposer_urls[target]['status']
             self.logger.info(f"Sending status request {request_id} to {host}:{port}")
             
             # Track the request
@@ -404,17 +615,18 @@ class PaxosClient:
                 self._track_request(request_id, operation_metadata, target)
             
             # Send the request (GET for status)
-            response = requests.get(url, timeout=5)
-            response_data = response.json()
+            response = self.session.get(url, timeout=5)
+            response_data = _parse_json(response)
             
             # Remove from pending
-            self.pending_requests.pop(request_id, None)
+            with self._state_lock:
+                self.pending_requests.pop(request_id, None)
             
             # Handle leader info
             if 'leader_id' in response_data:
                 leader_id = response_data.get('leader_id')
                 if leader_id and leader_id != 'unknown':
-                    self.current_leader = leader_id
+                    self._set_leader(leader_id)
             
             return response_data
             
@@ -424,7 +636,7 @@ class PaxosClient:
     
     def subscribe(self, patterns: List[str]) -> Dict[str, Any]:
         """Subscribe to notifications based on patterns."""
-        request_id = generate_request_id(self.client_id, {"type": "subscribe", "patterns": patterns})
+        request_id = self._new_request_id()
         
         # Create subscription request
         subscribe_request = {
@@ -441,12 +653,13 @@ class PaxosClient:
         host, port = self._get_random_learner()
         
         try:
-            url = f"http://{host}:{port}/subscribe"
+            url = self.learner_urls[(host, port)]['subscribe']
             self.logger.info(f"Sending subscription request to {host}:{port}")
             
             # Send the request
-            response = requests.post(url, json=subscribe_request, timeout=5)
-            response_data = response.json()
+            response = self.session.post(url, data=orjson.dumps(subscribe_request),
+                                         headers=_JSON_HEADERS, timeout=5)
+            response_data = _parse_json(response)
             
             if response_data.get('type') == 'SUBSCRIPTION_CONFIRMATION':
                 self.logger.info(f"Subscription confirmed: {response_data.get('subscription_id')}")
@@ -470,12 +683,13 @@ class PaxosClient:
         host, port = self._get_random_learner()
         
         try:
-            url = f"http://{host}:{port}/unsubscribe"
+            url = self.learner_urls[(host, port)]['unsubscribe']
             self.logger.info(f"Sending unsubscription request for {subscription_id}")
             
             # Send the request
-            response = requests.post(url, json=unsubscribe_request, timeout=5)
-            response_data = response.json()
+            response = self.session.post(url, data=orjson.dumps(unsubscribe_request),
+                                         headers=_JSON_HEADERS, timeout=5)
+            response_data = _parse_json(response)
             
             return response_data
             
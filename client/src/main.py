@@ -5,7 +5,9 @@ Main entry point for Client service.
 import os
 import json
 import atexit
-from flask import Flask, request, jsonify, render_template_string
+import orjson
+from flask import Flask, Response, request
+from waitress import serve
 
 from client import PaxosClient
 from common.utils import setup_logger, parse_hosts
@@ -15,6 +17,7 @@ CLIENT_ID = os.environ.get('CLIENT_ID', 'client1')
 CLIENT_PORT = int(os.environ.get('CLIENT_PORT', 8000))
 PROPOSER_HOSTS_STR = os.environ.get('PROPOSER_HOSTS', 'proposer1:6001,proposer2:6002')
 LEARNER_HOSTS_STR = os.environ.get('LEARNER_HOSTS', 'learner1:7001,learner2:7002')
+SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 32))
 
 # Parse hosts
 PROPOSER_HOSTS = parse_hosts(PROPOSER_HOSTS_STR)
@@ -30,6 +33,14 @@ client = PaxosClient(CLIENT_ID, PROPOSER_HOSTS, LEARNER_HOSTS)
 # Register shutdown function
 atexit.register(lambda: client.stop())
 
+def read_json():
+    """Parse the request body with orjson."""
+    return orjson.loads(request.get_data(cache=False))
+
+def json_response(payload, status=200):
+    """Build a JSON response with orjson instead of jsonify."""
+    return Response(orjson.dumps(payload), status=status, mimetype='application/json')
+
 # Simple HTML template for the web interface
 INDEX_TEMPLATE = """
 <!DOCTYPE html>
@@ -207,15 +218,18 @@ INDEX_TEMPLATE = """
 </html>
 """
 
+# The page has no template variables, so it is encoded once and served as is
+INDEX_BYTES = INDEX_TEMPLATE.encode('utf-8')
+
 @app.route('/')
 def index():
     """Display the web interface."""
-    return render_template_string(INDEX_TEMPLATE)
+    return Response(INDEX_BYTES, mimetype='text/html')
 
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
-    return jsonify({
+    return json_response({
         "status": "ok", 
         "client_id": CLIENT_ID
     })
@@ -234,85 +248,88 @@ def status():
             "retry_queue": len(client.retry_queue)
         })
         
-        return jsonify(status_info)
+        return json_response(status_info)
     except Exception as e:
         logger.error(f"Error getting status: {e}")
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}, 500)
 
 @app.route('/write', methods=['POST'])
 def write():
     """Handle write requests."""
     try:
-        data = request.json
+        data = read_json()
         key = data.get('key')
         value = data.get('value')
         
         if not key:
-            return jsonify({"error": "Key is required"}), 400
+            return json_response({"error": "Key is required"}, 400)
         
         logger.info(f"Received write request: key={key}, value={value}")
         
         response = client.write(key, value)
-        return jsonify(response)
+        return json_response(response)
     except Exception as e:
         logger.error(f"Error handling write request: {e}")
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}, 500)
 
 @app.route('/read', methods=['POST'])
 def read():
     """Handle read requests."""
     try:
-        data = request.json
+        data = read_json()
         key = data.get('key')
         consistency = data.get('consistency', 'eventual')
         
         if not key:
-            return jsonify({"error": "Key is required"}), 400
+            return json_response({"error": "Key is required"}, 400)
         
         logger.info(f"Received read request: key={key}, consistency={consistency}")
         
         response = client.read(key, consistency)
-        return jsonify(response)
+        return json_response(response)
     except Exception as e:
         logger.error(f"Error handling read request: {e}")
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}, 500)
 
 @app.route('/subscribe', methods=['POST'])
 def subscribe():
     """Handle subscription requests."""
     try:
-        data = request.json
+        data = read_json()
         patterns = data.get('patterns', [])
         
         if not patterns:
-            return jsonify({"error": "Patterns are required"}), 400
+            return json_response({"error": "Patterns are required"}, 400)
         
         logger.info(f"Received subscribe request with patterns: {patterns}")
         
         response = client.subscribe(patterns)
-        return jsonify(response)
+        return json_response(response)
     except Exception as e:
         logger.error(f"Error handling subscribe request: {e}")
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}, 500)
 
 @app.route('/unsubscribe', methods=['POST'])
 def unsubscribe():
     """Handle unsubscribe requests."""
     try:
-        data = request.json
+        data = read_json()
         subscription_id = data.get('subscription_id')
         
         if not subscription_id:
-            return jsonify({"error": "Subscription ID is required"}), 400
+            return json_response({"error": "Subscription ID is required"}, 400)
         
         logger.info(f"Received unsubscribe request: {subscription_id}")
         
         response = client.unsubscribe(subscription_id)
-        return jsonify(response)
+        return json_response(response)
     except Exception as e:
         logger.error(f"Error handling unsubscribe request: {e}")
-        return jsonify({"error": str(e)}), 500
+        return json_response({"error": str(e)}, 500)
 
 if __name__ == '__main__':
     logger.info(f"Starting Client {CLIENT_ID} on port {CLIENT_PORT}")
-    app.run(host='0.0.0.0', port=CLIENT_PORT, debug=False)
+    # Threaded WSGI server so requests waiting on the cluster don't block each
+    # other; one process keeps a single client and its retry thread
+    setup_logger('waitress')
+    serve(app, host='0.0.0.0', port=CLIENT_PORT, threads=SERVER_THREADS)
@@ -20,6 +20,25 @@ NOT_ACCEPTED = "NOT_ACCEPTED"
 
 # Message types from Acceptor to Learner
 LEARN = "LEARN"
+BATCH = "BATCH"
+
+# Message types from Proposer to Learner
+COMMIT = "COMMIT"
+
+# An acceptor holds the LEARN for an ACCEPT that names a commit target this
+# many milliseconds, waiting for the proposer to report the learners have it,
+# before broadcasting it itself; longer than the default 500 ms heartbeat
+# interval so an idle leader's next heartbeat can still carry the report
+COMMIT_FALLBACK_MS = 1000
+
+# Outbound batching: flush after this many messages or milliseconds
+MAX_BATCH = 128
+MAX_BATCH_MS = 2
+
+# Client writes proposed together in one Paxos slot: at most this many,
+# gathered for at most this many milliseconds
+MAX_WRITE_BATCH = 64
+MAX_WRITE_BATCH_MS = 1
 
 # Message types between Learners
 SYNC_REQUEST = "SYNC_REQUEST"
@@ -3,166 +3,169 @@ Message structure definitions for the Paxos protocol.
 """
 
 import time
-import uuid
-from dataclasses import dataclass, asdict, field
+import os
 from typing import Dict, List, Any, Optional, Union
 
+from msgspec import Struct, field
+
 
 def generate_tid():
     """Generate a unique transaction ID."""
-    return str(uuid.uuid4())
+    return os.urandom(16).hex()
+
+
+def with_to_dict(cls):
+    """Give a message struct a to_dict() that builds one flat dict literal.
+    
+    Messages hold only plain values, so there is no need for a recursive
+    conversion that deep-copies every nested dict and list.
+    """
+    items = ", ".join(f"{name!r}: self.{name}" for name in cls.__struct_fields__)
+    source = (
+        "def to_dict(self):\n"
+        "    \"\"\"Convert message to dictionary.\"\"\"\n"
+        f"    return {{{items}}}\n"
+    )
+    namespace = {}
+    exec(source, namespace)
+    cls.to_dict = namespace['to_dict']
+    return cls
 
 
-@dataclass
-class Message:
+@with_to_dict
+class Message(Struct):
     """Base class for all messages."""
     type: str
-    timestamp: float = field(default_factory=time.time)
-    
-    def to_dict(self):
-        """Convert message to dictionary."""
-        return asdict(self)
+    # Message timestamps are wall-clock nanoseconds from time.time_ns()
+    timestamp: int = field(default_factory=time.time_ns)
 
 
-@dataclass
-class PrepareMessage:
+# Hot Paxos messages are never compared by value and never form reference
+# cycles, so they skip __eq__ and garbage-collector tracking
+@with_to_dict
+class PrepareMessage(Struct, eq=False, gc=False):
     """Prepare message from Proposer to Acceptor."""
     type: str
     proposal_number: int
     proposer_id: str
-    timestamp: float = field(default_factory=time.time)
-    
-    def to_dict(self):
-        """Convert message to dictionary."""
-        return asdict(self)
+    timestamp: int = field(default_factory=time.time_ns)
 
 
-@dataclass
-class AcceptMessage:
+@with_to_dict
+class AcceptMessage(Struct, eq=False, gc=False):
     """Accept message from Proposer to Acceptor."""
     type: str
     proposal_number: int
     value: Any
     proposer_id: str
-    timestamp: float = field(default_factory=time.time)
-    
-    def to_dict(self):
-        """Convert message to dictionary."""
-        return asdict(self)
+    timestamp: int = field(default_factory=time.time_ns)
+    # Proposer that commits to the learners itself, and the proposals it
+    # has since committed: a proposal number once every learner acknowledged
+    # it, else [proposal_number, ["host:port" of the learners that did]]
+    commit_target: Optional[str] = None
+    committed: Optional[List[Any]] = None
 
 
-@dataclass
-class HeartbeatMessage:
+@with_to_dict
+class HeartbeatMessage(Struct, eq=False, gc=False):
     """Heartbeat message from Leader to all nodes."""
     type: str
     leader_id: str
     sequence_number: int
-    timestamp: float = field(default_factory=time.time)
-    
-    def to_dict(self):
-        """Convert message to dictionary."""
-        return asdict(self)
+    timestamp: int = field(default_factory=time.time_ns)
+    # Commit reports this acceptor hasn't taken yet, as in AcceptMessage
+    committed: Optional[List[Any]] = None
 
 
-@dataclass
-class PromiseMessage:
+@with_to_dict
+class PromiseMessage(Struct, eq=False, gc=False):
     """Promise message from Acceptor to Proposer."""
     type: str
     proposal_number: int
     accepted_proposal: Optional[int] = None
     accepted_value: Optional[Any] = None
     tid: str = field(default_factory=generate_tid)
-    timestamp: float = field(default_factory=time.time)
-    
-    def to_dict(self):
-        """Convert message to dictionary."""
-        return asdict(self)
+    timestamp: int = field(default_factory=time.time_ns)
 
 
-@dataclass
-class NotPromiseMessage:
+@with_to_dict
+class NotPromiseMessage(Struct):
     """Not Promise message from Acceptor to Proposer."""
     type: str
     promised_proposal: int
     tid: str = field(default_factory=generate_tid)
-    timestamp: float = field(default_factory=time.time)
-    
-    def to_dict(self):
-        """Convert message to dictionary."""
-        return asdict(self)
+    timestamp: int = field(default_factory=time.time_ns)
 
 
-@dataclass
-class AcceptedMessage:
+@with_to_dict
+class AcceptedMessage(Struct, eq=False, gc=False):
     """Accepted message from Acceptor to Proposer."""
     type: str
     proposal_number: int
     value: Any
     tid: str = field(default_factory=generate_tid)
-    timestamp: float = field(default_factory=time.time)
-    
-    def to_dict(self):
-        """Convert message to dictionary."""
-        return asdict(self)
+    timestamp: int = field(default_factory=time.time_ns)
 
 
-@dataclass
-class NotAcceptedMessage:
+@with_to_dict
+class NotAcceptedMessage(Struct):
     """Not Accepted message from Acceptor to Proposer."""
     type: str
     promised_proposal: int
     tid: str = field(default_factory=generate_tid)
-    timestamp: float = field(default_factory=time.time)
-    
-    def to_dict(self):
-        """Convert message to dictionary."""
-        return asdict(self)
+    timestamp: int = field(default_factory=time.time_ns)
 
 
-@dataclass
-class LearnMessage:
+@with_to_dict
+class LearnMessage(Struct, eq=False, gc=False):
     """Learn message from Acceptor to Learner."""
     type: str
     proposal_number: int
     value: Any
     acceptor_id: str
     tid: str
-    timestamp: float = field(default_factory=time.time)
-    
-    def to_dict(self):
-        """Convert message to dictionary."""
-        return asdict(self)
+    timestamp: int = field(default_factory=time.time_ns)
 
 
-@dataclass
-class SyncRequestMessage:
+@with_to_dict
+class CommitMessage(Struct, eq=False, gc=False):
+    """Commit message from the deciding Proposer to Learners."""
+    type: str
+    proposal_number: int
+    value: Any
+    proposer_id: str
+    timestamp: int = field(default_factory=time.time_ns)
+
+
+@with_to_dict
+class BatchMessage(Struct, eq=False, gc=False):
+    """Several messages of one type sent in a single request."""
+    type: str
+    messages: List[Dict[str, Any]]
+    timestamp: int = field(default_factory=time.time_ns)
+
+
+@with_to_dict
+class SyncRequestMessage(Struct):
     """Sync request message between Learners."""
     type: str
     from_seq: int
     to_seq: int
     learner_id: str
-    timestamp: float = field(default_factory=time.time)
-    
-    def to_dict(self):
-        """Convert message to dictionary."""
-        return asdict(self)
+    timestamp: int = field(default_factory=time.time_ns)
 
 
-@dataclass
-class SyncResponseMessage:
+@with_to_dict
+class SyncResponseMessage(Struct):
     """Sync response message between Learners."""
     type: str
     decisions: List[Dict[str, Any]]
     learner_id: str
-    timestamp: float = field(default_factory=time.time)
-    
-    def to_dict(self):
-        """Convert message to dictionary."""
-        return asdict(self)
+    timestamp: int = field(default_factory=time.time_ns)
 
 
-@dataclass
-class WriteRequestMessage:
+@with_to_dict
+class WriteRequestMessage(Struct):
     """Write request message from Client to Proposer."""
     type: str
     request_id: str
@@ -170,94 +173,66 @@ class WriteRequestMessage:
     operation: Dict[str, Any]
     timeout_ms: Optional[int] = None
     metadata: Dict[str, str] = field(default_factory=dict)
-    timestamp: float = field(default_factory=time.time)
-    
-    def to_dict(self):
-        """Convert message to dictionary."""
-        return asdict(self)
+    timestamp: int = field(default_factory=time.time_ns)
 
 
-@dataclass
-class WriteResponseMessage:
+@with_to_dict
+class WriteResponseMessage(Struct):
     """Write response message from Proposer to Client."""
     type: str
     request_id: str
     success: bool
     sequence_number: Optional[int] = None
     leader_hint: Optional[str] = None
-    timestamp: float = field(default_factory=time.time)
-    
-    def to_dict(self):
-        """Convert message to dictionary."""
-        return asdict(self)
+    timestamp: int = field(default_factory=time.time_ns)
 
 
-@dataclass
-class ReadRequestMessage:
+@with_to_dict
+class ReadRequestMessage(Struct):
     """Read request message from Client."""
     type: str
     request_id: str
     query: Dict[str, Any]
     consistency_level: str  # "strong", "session", "eventual"
     client_id: str
-    timestamp: float = field(default_factory=time.time)
-    
-    def to_dict(self):
-        """Convert message to dictionary."""
-        return asdict(self)
+    timestamp: int = field(default_factory=time.time_ns)
 
 
-@dataclass
-class ReadResponseMessage:
+@with_to_dict
+class ReadResponseMessage(Struct):
     """Read response message to Client."""
     type: str
     request_id: str
     result: Any
     sequence_number: int
-    timestamp: float = field(default_factory=time.time)
-    
-    def to_dict(self):
-        """Convert message to dictionary."""
-        return asdict(self)
+    timestamp: int = field(default_factory=time.time_ns)
 
 
-@dataclass
-class RedirectMessage:
+@with_to_dict
+class RedirectMessage(Struct):
     """Redirect message to Client."""
     type: str
     request_id: str
     correct_leader: str
     reason: str
-    timestamp: float = field(default_factory=time.time)
-    
-    def to_dict(self):
-        """Convert message to dictionary."""
-        return asdict(self)
+    timestamp: int = field(default_factory=time.time_ns)
 
 
-@dataclass
-class StatusRequestMessage:
+@with_to_dict
+class StatusRequestMessage(Struct):
     """Status request message from Client."""
     type: str
     request_id: str
     query_type: str
     client_id: str
-    timestamp: float = field(default_factory=time.time)
-    
-    def to_dict(self):
-        """Convert message to dictionary."""
-        return asdict(self)
+    timestamp: int = field(default_factory=time.time_ns)
 
 
-@dataclass
-class StatusResponseMessage:
+@with_to_dict
+class StatusResponseMessage(Struct):
     """Status response message to Client."""
     type: str
     request_id: str
     status_info: Dict[str, Any]
     topology_update: Optional[Dict[str, Any]] = None
-    timestamp: float = field(default_factory=time.time)
-    
-    def to_dict(self):
-        """Convert message to dictionary."""
-        return asdict(self)
\ No newline at end of file
+    timestamp: int = field(default_factory=time.time_ns)
@@ -2,17 +2,24 @@
 Utility functions for the Paxos implementation.
 """
 
-import json
 import logging
 import os
+import sys
 import time
 import hashlib
+import struct
 import random
+import functools
+import orjson
+import msgpack
 from typing import Dict, List, Any, Tuple, Optional
 
+from common.constants import LEARN
+
 # Configure logging
+@functools.lru_cache(maxsize=None)
 def setup_logger(name, log_level=None):
-    """Set up logger with specified log level."""
+    """Set up logger with specified log level (memoized per name and level)."""
     if log_level is None:
         log_level = os.environ.get('LOG_LEVEL', 'INFO')
     
@@ -29,20 +36,52 @@ def setup_logger(name, log_level=None):
         formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
         handler.setFormatter(formatter)
         logger.addHandler(handler)
+        # Don't repeat records through a root handler (e.g. one installed by the WSGI server)
+        logger.propagate = False
     
     return logger
 
+_LOGGER = setup_logger('utils')
+
+# Directories save_to_file has already created or found
+_KNOWN_DIRS = set()
+
 # File persistence utilities
+# Internal snapshots with this extension are stored as msgpack, others as JSON
+MSGPACK_EXT = '.msgpack'
+
+def atomic_write(filepath: str, payload: bytes) -> None:
+    """Durably replace a file's contents so a crash leaves the old or the new version."""
+    # Write and sync a temporary file, then rename it over the old one.
+    # fdatasync still flushes the new file's size, so it is enough here.
+    tmp_path = f"{filepath}.tmp"
+    fd = os.open(tmp_path, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o644)
+    try:
+        os.write(fd, payload)
+        os.fdatasync(fd)
+        # Snapshots are only read back on restart; don't keep them cached
+        if hasattr(os, 'posix_fadvise'):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    os.replace(tmp_path, filepath)
+
 def save_to_file(data: Any, filepath: str) -> bool:
-    """Save data to file."""
+    """Save data to file, atomically replacing any previous version."""
     try:
-        os.makedirs(os.path.dirname(filepath), exist_ok=True)
-        with open(filepath, 'w') as f:
-            json.dump(data, f)
+        if filepath.endswith(MSGPACK_EXT):
+            payload = msgpack.packb(data, use_bin_type=True)
+        else:
+            payload = orjson.dumps(data, option=orjson.OPT_NON_STR_KEYS)
+        dirname = os.path.dirname(filepath)
+        if dirname not in _KNOWN_DIRS:
+            os.makedirs(dirname, exist_ok=True)
+            _KNOWN_DIRS.add(dirname)
+        
+        atomic_write(filepath, payload)
         return True
     except Exception as e:
-        logger = setup_logger('utils')
-        logger.error(f"Error saving to file {filepath}: {e}")
+        _LOGGER.error(f"Error saving to file {filepath}: {e}")
         return False
 
 def load_from_file(filepath: str) -> Optional[Any]:
@@ -50,11 +89,13 @@ def load_from_file(filepath: str) -> Optional[Any]:
     try:
         if not os.path.exists(filepath):
             return None
-        with open(filepath, 'r') as f:
-            return json.load(f)
+        with open(filepath, 'rb') as f:
+            payload = f.read()
+        if filepath.endswith(MSGPACK_EXT):
+            return msgpack.unpackb(payload, raw=False, strict_map_key=False)
+        return orjson.loads(payload)
     except Exception as e:
-        logger = setup_logger('utils')
-        logger.error(f"Error loading from file {filepath}: {e}")
+        _LOGGER.error(f"Error loading from file {filepath}: {e}")
         return None
 
 # Network utilities
@@ -65,24 +106,99 @@ def parse_hosts(hosts_str: str) -> List[Tuple[str, int]]:
     
     hosts = []
     for host_str in hosts_str.split(','):
-        host_parts = host_str.strip().split(':')
-        if len(host_parts) == 2:
-            host, port = host_parts
+        host, sep, port = host_str.strip().partition(':')
+        # Entries without a numeric port are skipped rather than raising
+        if sep and port.isdigit():
             hosts.append((host, int(port)))
     
     return hosts
 
+# Wire encoding
+MSGPACK_MIMETYPE = 'application/msgpack'
+MSGPACK_HEADERS = {'Content-Type': MSGPACK_MIMETYPE}
+JSON_HEADERS = {'Content-Type': 'application/json'}
+
+def pack_message(data: Any) -> bytes:
+    """Encode a message dict as msgpack for the wire."""
+    return msgpack.packb(data, use_bin_type=True)
+
+def unpack_message(body: bytes, content_type: Optional[str]) -> Any:
+    """Decode a message body as msgpack or JSON, according to its content type."""
+    if content_type and content_type.startswith(MSGPACK_MIMETYPE):
+        message = msgpack.unpackb(body, raw=False, strict_map_key=False)
+    else:
+        message = orjson.loads(body)
+    
+    # Interned like the constants they are checked against, so the
+    # equality test in each handler's type dispatch is a pointer compare
+    if isinstance(message, dict):
+        message_type = message.get('type')
+        if isinstance(message_type, str):
+            message['type'] = sys.intern(message_type)
+    return message
+
+# LEARN bodies are a fixed-schema msgpack array with one positional
+# [proposal_number, value, acceptor_id, tid, timestamp] row per message,
+# so field names never go on the wire and a batch is just more rows
+LEARN_MIMETYPE = 'application/x-paxos-learn'
+LEARN_HEADERS = {'Content-Type': LEARN_MIMETYPE}
+
+def pack_learns(learn_msgs: List[Dict[str, Any]]) -> bytes:
+    """Encode LEARN message dicts as positional msgpack rows."""
+    return msgpack.packb([
+        (learn_msg['proposal_number'], learn_msg['value'], learn_msg['acceptor_id'],
+         learn_msg['tid'], learn_msg['timestamp'])
+        for learn_msg in learn_msgs
+    ], use_bin_type=True)
+
+def unpack_learns(body: bytes) -> List[Dict[str, Any]]:
+    """Decode a body written by pack_learns back into LEARN message dicts."""
+    return [
+        {
+            'type': LEARN,
+            'proposal_number': proposal_number,
+            'value': value,
+            'acceptor_id': acceptor_id,
+            'tid': tid,
+            'timestamp': timestamp
+        }
+        for proposal_number, value, acceptor_id, tid, timestamp
+        in msgpack.unpackb(body, raw=False, strict_map_key=False)
+    ]
+
+# Steady-state heartbeats are a bare [leader_id, sequence_number, committed]
+# msgpack row; the full HeartbeatMessage is only sent when a proposer takes over
+HEARTBEAT_LITE_MIMETYPE = 'application/x-paxos-heartbeat'
+HEARTBEAT_LITE_HEADERS = {'Content-Type': HEARTBEAT_LITE_MIMETYPE}
+
+def pack_heartbeat_lite(leader_id: str, sequence_number: int, committed: List[Any] = ()) -> bytes:
+    """Encode a lite heartbeat as a positional msgpack row."""
+    return msgpack.packb((leader_id, sequence_number, committed), use_bin_type=True)
+
+def unpack_heartbeat_lite(body: bytes) -> Tuple[str, int, List[Any]]:
+    """Decode a body written by pack_heartbeat_lite."""
+    row = msgpack.unpackb(body, raw=False)
+    # Rows from before the committed list was added carry two fields
+    committed = row[2] if len(row) > 2 else []
+    return row[0], row[1], committed
+
 # Unique ID generation
 def generate_request_id(client_id: str, operation: Dict[str, Any]) -> str:
     """Generate a unique request ID for client operations."""
-    timestamp = str(time.time())
-    nonce = str(random.randint(0, 999999))
-    data = f"{client_id}:{json.dumps(operation)}:{timestamp}:{nonce}"
-    return hashlib.sha256(data.encode()).hexdigest()
+    data = b'\x00'.join((
+        client_id.encode(),
+        orjson.dumps(operation, option=orjson.OPT_SORT_KEYS | orjson.OPT_NON_STR_KEYS),
+        struct.pack('<dQ', time.time(), random.getrandbits(64))
+    ))
+    return hashlib.blake2b(data, digest_size=32).hexdigest()
 
 # Exponential backoff
 def calculate_backoff(attempt: int, base_ms: int = 100, max_ms: int = 10000) -> float:
     """Calculate exponential backoff time in seconds."""
-    backoff_ms = min(base_ms * (2 ** attempt), max_ms)
-    jitter = random.uniform(0.8, 1.2)  # Add jitter to avoid thundering herd
-    return (backoff_ms * jitter) / 1000  # Convert to seconds
+    backoff_ms = min(base_ms << attempt, max_ms)
+    jitter = 0.8 + 0.4 * random.random()  # Add jitter to avoid thundering herd
+    return backoff_ms * jitter * 1e-3  # Convert to seconds
+
+def decorrelated_backoff(previous: float, base: float = 0.5, cap: float = 30.0) -> float:
+    """Calculate the next decorrelated-jitter backoff in seconds from the previous one."""
+    return min(cap, random.uniform(base, max(base, previous * 3)))
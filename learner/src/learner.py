@@ -3,14 +3,18 @@ Learner component implementation for Paxos protocol.
 """
 
 import os
+import re
 import time
 import json
 import uuid
 import threading
-import random
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from typing import Dict, Any, List, Optional, Tuple, Set
 
+import orjson
 import requests
+from sortedcontainers import SortedList
+from requests.adapters import HTTPAdapter
 
 from common.constants import (
     LEARN, SYNC_REQUEST, SYNC_RESPONSE, SNAPSHOT_REQUEST, SNAPSHOT_RESPONSE,
@@ -20,8 +24,47 @@ from common.message import (
     LearnMessage, SyncRequestMessage, SyncResponseMessage,
     ReadResponseMessage, StatusResponseMessage
 )
-from common.utils import setup_logger, save_to_file, load_from_file, parse_hosts
+from common.utils import setup_logger, save_to_file, load_from_file, parse_hosts, JSON_HEADERS
 
+# Decision WAL: fdatasync once this many bytes are pending (or every flush
+# interval), and fold it into the decisions log snapshot after this many
+# records or seconds
+_WAL_BYTES_PER_SYNC = 256 * 1024
+_WAL_FLUSH_INTERVAL = 1.0
+_WAL_COMPACT_RECORDS = 1000
+_WAL_COMPACT_INTERVAL = 30.0
+
+# Application state: put/delete deltas are appended to a log and folded into
+# a full state snapshot after this many deltas or seconds
+_STATE_DELTAS_PER_SNAPSHOT = 100
+_STATE_SNAPSHOT_INTERVAL = 30.0
+
+# Subscriptions are striped over this many dicts (a power of two), each with
+# its own lock, so subscribe/unsubscribe/notify traffic doesn't serialize
+_SUBSCRIPTION_STRIPES = 16
+
+def _acceptor_bit(acceptor_id: str) -> int:
+    """Bit for a (numeric) acceptor id in a decision's confirming_acceptors mask."""
+    return 1 << int(acceptor_id)
+
+def _compile_patterns(patterns: List[str]) -> Optional[re.Pattern]:
+    """Compile a subscription's interest patterns into one matcher, or None to match all."""
+    if not patterns:
+        return None
+    # One alternation matched against the encoded value, so a decision costs
+    # one C-level search per subscription however many patterns it has
+    return re.compile(b"|".join(b"(?:%s)" % p.encode() for p in patterns))
+
+def _upgrade_entry(entry: Dict[str, Any]) -> Dict[str, Any]:
+    """Turn an older entry's list of confirming acceptors into a bitmask."""
+    confirmers = entry['confirming_acceptors']
+    if isinstance(confirmers, list):
+        mask = 0
+        for acceptor_id in confirmers:
+            mask |= _acceptor_bit(acceptor_id)
+        entry['confirming_acceptors'] = mask
+        entry['confirmer_count'] = bin(mask).count('1')
+    return entry
 
 class Learner:
     """Learner implementation for Paxos protocol."""
@@ -34,8 +77,14 @@ class Learner:
         self.learner_id = learner_id
         self.data_dir = f"{data_dir}/learner{learner_id}"
         self.state_file = f"{self.data_dir}/state.json"
-        self.log_file = f"{self.data_dir}/decisions_log.json"
-        self.snapshot_file = f"{self.data_dir}/state_snapshot.json"
+        self.log_file = f"{self.data_dir}/decisions_log.msgpack"
+        self.wal_file = f"{self.data_dir}/decisions_log.wal"
+        self.snapshot_file = f"{self.data_dir}/state_snapshot.msgpack"
+        self.delta_file = f"{self.data_dir}/state_deltas.log"
+        # Formats written before the internal snapshots moved to msgpack
+        self.legacy_log_file = f"{self.data_dir}/decisions_log.json"
+        self.legacy_wal_file = f"{self.legacy_log_file}.wal"
+        self.legacy_snapshot_file = f"{self.data_dir}/state_snapshot.json"
         
         self.acceptor_hosts = acceptor_hosts or []
         self.other_learners = learner_hosts or []
@@ -45,7 +94,7 @@ class Learner:
         self.logger = setup_logger(f"learner-{learner_id}")
         
         # Initialize learner state
-        self.decisions = {}  # proposal_number -> DecisionEntry
+        self.decisions = {}  # proposal_number (int) -> DecisionEntry
         self.last_applied = 0
         self.highest_seen = 0
         
@@ -54,38 +103,96 @@ class Learner:
         
         # Application state (would be determined by the actual application)
         self.application_state = {}
+        # Sorted string keys of application_state, so prefix reads seek
+        # instead of scanning the whole state
+        self._sorted_keys = SortedList()
+        
+        # Subscriptions from clients, striped by subscription id
+        self._subscriptions = [{} for _ in range(_SUBSCRIPTION_STRIPES)]  # subscription_id -> subscription_info
+        self._sub_locks = [threading.Lock() for _ in range(_SUBSCRIPTION_STRIPES)]
+        
+        # Guards the decisions and application state, since the WSGI server
+        # runs handlers on many threads; never held across HTTP calls
+        self._lock = threading.RLock()
+        
+        # Sync requests reuse one keep-alive connection per peer learner
+        self._session = requests.Session()
+        self._session.mount('http://', HTTPAdapter(pool_connections=32, pool_maxsize=32))
         
-        # Subscriptions from clients
-        self.subscriptions = {}  # subscription_id -> subscription_info
+        # Peers are asked concurrently so one partitioned learner can't stall a sync
+        self._sync_pool = ThreadPoolExecutor(max_workers=max(min(8, len(self.other_learners)), 1),
+                                             thread_name_prefix=f"learner-{learner_id}-sync")
         
         # Load state if available
         self._load_state()
         
+        # Lowest proposal number after last_applied with no decision entry yet;
+        # it only moves forward, so gap checks never rescan the known range
+        self._next_gap = self.last_applied + 1
+        self._advance_next_gap(self._next_gap)
+        
+        # LEARNs append the decisions they change to a write-behind log; a
+        # flusher thread syncs it and periodically folds it into the snapshot
+        os.makedirs(self.data_dir, exist_ok=True)
+        self._wal_cv = threading.Condition()
+        self._wal = open(self.wal_file, 'ab', buffering=1 << 20)
+        self._wal_pending_bytes = 0
+        self._wal_records = 0
+        self._last_compact = time.monotonic()
+        
+        # State deltas share the WAL's condition and flusher
+        self._deltas = open(self.delta_file, 'ab', buffering=1 << 20)
+        self._last_state_snapshot = time.monotonic()
+        
         # Start background synchronization
         self.stop_threads = False
+        self._stop_evt = threading.Event()  # Wakes the sync loop early on stop()
+        self._sync_ticks = 0
         self.sync_thread = threading.Thread(target=self._periodic_sync)
         self.sync_thread.daemon = True
         self.sync_thread.start()
         
+        self.flush_thread = threading.Thread(target=self._flush_loop)
+        self.flush_thread.daemon = True
+        self.flush_thread.start()
+        
         self.logger.info(f"Learner {learner_id} initialized. Last applied: {self.last_applied}, "
                         f"highest seen: {self.highest_seen}")
     
     def stop(self):
         """Stop the learner background threads."""
         self.stop_threads = True
+        self._stop_evt.set()
+        with self._wal_cv:
+            self._wal_cv.notify()
         self.sync_thread.join(timeout=2)
+        self.flush_thread.join(timeout=2)
+        self._sync_pool.shutdown(wait=False)
+        
+        # Make whatever the flusher had not synced yet durable
+        with self._wal_cv:
+            for log in (self._wal, self._deltas):
+                log.flush()
+                os.fdatasync(log.fileno())
         self.logger.info("Learner stopped")
     
     def _load_state(self) -> None:
         """Load learner state from persistent storage."""
         # Load decisions log
-        decisions_log = load_from_file(self.log_file)
+        decisions_log = self._load_snapshot(self.log_file, self.legacy_log_file)
         if decisions_log:
-            self.decisions = decisions_log
-            self.logger.info(f"Loaded {len(self.decisions)} decisions from log")
+            # JSON object keys from an older version come back as strings
+            self.decisions = {int(p): _upgrade_entry(entry) for p, entry in decisions_log.items()}
+        if os.path.exists(self.legacy_wal_file) and not os.path.exists(self.wal_file):
+            os.replace(self.legacy_wal_file, self.wal_file)
+        replayed = self._replay_wal()
+        
+        if self.decisions:
+            self.logger.info(f"Loaded {len(self.decisions)} decisions from log "
+                             f"({replayed} records replayed from WAL)")
             
             # Determine highest seen and last applied
-            proposal_numbers = [int(p) for p in self.decisions.keys()]
+            proposal_numbers = list(self.decisions)
             if proposal_numbers:
                 self.highest_seen = max(proposal_numbers)
                 
@@ -98,17 +205,132 @@ class Learner:
                         break
         
         # Load application state snapshot
-        state_snapshot = load_from_file(self.snapshot_file)
+        state_snapshot = self._load_snapshot(self.snapshot_file, self.legacy_snapshot_file)
         if state_snapshot:
             self.application_state = state_snapshot.get('state', {})
             snapshot_version = state_snapshot.get('version', 0)
             self.logger.info(f"Loaded application state snapshot version {snapshot_version}")
+        else:
+            snapshot_version = 0
+        self._state_deltas = self._replay_state_deltas(snapshot_version)
+        self._sorted_keys = SortedList(k for k in self.application_state if isinstance(k, str))
     
-    def _save_decisions_log(self) -> None:
-        """Save decisions log to persistent storage."""
-        success = save_to_file(self.decisions, self.log_file)
-        if not success:
-            self.logger.error("Failed to save decisions log")
+    def _load_snapshot(self, filepath: str, legacy_filepath: str) -> Optional[Any]:
+        """Read a msgpack snapshot, falling back to a JSON one from an older version."""
+        if os.path.exists(filepath):
+            return load_from_file(filepath)
+        return load_from_file(legacy_filepath)
+    
+    def _read_log_lines(self, filepath: str) -> List[Any]:
+        """Read the JSON lines of an append-only log, dropping a torn tail."""
+        if not os.path.exists(filepath):
+            return []
+        
+        records = []
+        good_end = 0
+        with open(filepath, 'rb') as f:
+            for line in f:
+                try:
+                    if not line.endswith(b"\n"):
+                        raise ValueError("unterminated record")
+                    records.append(orjson.loads(line))
+                except ValueError:
+                    # A torn final line left by a crash mid-append
+                    break
+                good_end += len(line)
+            size = f.seek(0, os.SEEK_END)
+        
+        # Cut off the torn tail so new appends don't land behind it
+        if good_end < size:
+            self.logger.warning(f"Truncating torn log {filepath} at byte {good_end}")
+            os.truncate(filepath, good_end)
+        return records
+    
+    def _replay_wal(self) -> int:
+        """Apply the decision entries appended since the last snapshot."""
+        entries = self._read_log_lines(self.wal_file)
+        for entry in entries:
+            # Each line is the full entry, so the last one for a proposal wins
+            self.decisions[entry['proposal_number']] = _upgrade_entry(entry)
+        return len(entries)
+    
+    def _replay_state_deltas(self, snapshot_version: int) -> int:
+        """Apply the state deltas logged after the loaded snapshot."""
+        replayed = 0
+        for proposal_number, op, key, *val in self._read_log_lines(self.delta_file):
+            # Deltas already folded into the snapshot survive a crash
+            # between writing it and truncating the log; skip those
+            if proposal_number <= snapshot_version:
+                continue
+            if op == 'put':
+                self.application_state[key] = val[0]
+            else:
+                self.application_state.pop(key, None)
+            replayed += 1
+        if replayed:
+            self.logger.info(f"Replayed {replayed} state deltas from {self.delta_file}")
+        return replayed
+    
+    def _save_decisions_log(self, proposal_numbers: List[int]) -> None:
+        """Append the current entries for these proposals to the decision WAL."""
+        lines = b"".join(
+            orjson.dumps(self.decisions[p], option=orjson.OPT_NON_STR_KEYS) + b"\n"
+            for p in proposal_numbers
+        )
+        with self._wal_cv:
+            self._wal.write(lines)
+            self._wal_pending_bytes += len(lines)
+            self._wal_records += len(proposal_numbers)
+            if self._wal_pending_bytes >= _WAL_BYTES_PER_SYNC:
+                self._wal_cv.notify()
+    
+    def _flush_loop(self) -> None:
+        """Sync the decision WAL in the background and compact it periodically."""
+        while not self.stop_threads:
+            try:
+                with self._wal_cv:
+                    self._wal_cv.wait(timeout=_WAL_FLUSH_INTERVAL)
+                    compact = self._wal_records >= _WAL_COMPACT_RECORDS or (
+                        self._wal_records > 0 and
+                        time.monotonic() - self._last_compact >= _WAL_COMPACT_INTERVAL
+                    )
+                    if not self._wal_pending_bytes and not compact:
+                        continue
+                    self._wal.flush()
+                    self._deltas.flush()
+                    self._wal_pending_bytes = 0
+                    # Own descriptors: compaction may close and reopen the
+                    # files once the lock is released
+                    fds = [os.dup(self._wal.fileno())]
+                    fds.append(os.dup(self._deltas.fileno()))
+                
+                # Sync outside the lock so LEARNs keep appending meanwhile
+                try:
+                    for fd in fds:
+                        os.fdatasync(fd)
+                finally:
+                    for fd in fds:
+                        os.close(fd)
+                if compact:
+                    self._compact_wal()
+            except Exception as e:
+                self.logger.error(f"Error flushing decisions log: {e}")
+    
+    def _compact_wal(self) -> None:
+        """Fold the WAL into the decisions snapshot and start an empty WAL."""
+        # Same lock order as the LEARN path: state lock, then the WAL's
+        with self._lock, self._wal_cv:
+            if not save_to_file(self.decisions, self.log_file):
+                self.logger.error("Failed to save decisions log")
+                return
+            
+            # Replaying a WAL over a snapshot that already covers it is
+            # harmless, so a crash before the truncate loses nothing
+            self._wal.close()
+            self._wal = open(self.wal_file, 'wb', buffering=1 << 20)
+            self._wal_pending_bytes = 0
+            self._wal_records = 0
+            self._last_compact = time.monotonic()
     
     def _save_state_snapshot(self) -> None:
         """Save application state snapshot to persistent storage."""
@@ -120,75 +342,195 @@ class Learner:
         success = save_to_file(snapshot, self.snapshot_file)
         if not success:
             self.logger.error("Failed to save application state snapshot")
+            return
+        
+        # The snapshot covers every logged delta, so start an empty delta log
+        with self._wal_cv:
+            self._deltas.close()
+            self._deltas = open(self.delta_file, 'wb', buffering=1 << 20)
+        self._state_deltas = 0
+        self._last_state_snapshot = time.monotonic()
+    
+    def _log_state_delta(self, delta: List[Any]) -> None:
+        """Append one put/delete to the state delta log."""
+        line = orjson.dumps(delta, option=orjson.OPT_NON_STR_KEYS) + b"\n"
+        with self._wal_cv:
+            self._deltas.write(line)
+            self._wal_pending_bytes += len(line)
+        self._state_deltas += 1
     
     def _create_decision_entry(self, proposal_number: int, value: Any, 
-                              acceptor_id: str) -> Dict[str, Any]:
-        """Create a new decision entry."""
+                              acceptor_id: Optional[str]) -> Dict[str, Any]:
+        """Create a new decision entry; without an acceptor it comes from a proposer's commit."""
+        now = time.time()
         return {
             'proposal_number': proposal_number,
             'value': value,
-            'confirming_acceptors': [acceptor_id],
-            'first_notification': time.time(),
-            'last_notification': time.time(),
-            'is_definitely_decided': False
+            'confirming_acceptors': _acceptor_bit(acceptor_id) if acceptor_id is not None else 0,
+            'confirmer_count': 1 if acceptor_id is not None else 0,
+            'first_notification': now,
+            'last_notification': now,
+            'is_definitely_decided': acceptor_id is None
         }
     
     def _update_decision_entry(self, proposal_number: int, acceptor_id: str) -> None:
         """Update an existing decision entry with a new acceptor confirmation."""
-        if str(proposal_number) in self.decisions:
-            entry = self.decisions[str(proposal_number)]
-            if acceptor_id not in entry['confirming_acceptors']:
-                entry['confirming_acceptors'].append(acceptor_id)
+        if proposal_number in self.decisions:
+            entry = self.decisions[proposal_number]
+            bit = _acceptor_bit(acceptor_id)
+            if not entry['confirming_acceptors'] & bit:
+                entry['confirming_acceptors'] |= bit
+                entry['confirmer_count'] += 1
             entry['last_notification'] = time.time()
             
             # Check if quorum is reached
-            if len(entry['confirming_acceptors']) >= self.quorum_size:
+            if entry['confirmer_count'] >= self.quorum_size:
                 entry['is_definitely_decided'] = True
                 
                 # Apply to application state if this is the next in sequence
                 if (self.last_applied + 1) == proposal_number:
-                    self._apply_decision(proposal_number)
+                    self._apply_ready()
     
-    def _apply_decision(self, proposal_number: int) -> None:
-        """Apply a decision to the application state."""
-        if str(proposal_number) not in self.decisions:
-            return
-        
-        entry = self.decisions[str(proposal_number)]
+    def _apply_ready(self) -> None:
+        """Apply every decided proposal that directly follows the last applied one."""
+        # One forward walk; applying K consecutive decisions costs K lookups
+        decisions = self.decisions
+        proposal_number = self.last_applied + 1
+        entry = decisions.get(proposal_number)
+        while entry is not None and entry['is_definitely_decided']:
+            self._apply_one(proposal_number, entry)
+            proposal_number += 1
+            entry = decisions.get(proposal_number)
+        
+        # Fold the deltas into a full snapshot once enough have accumulated;
+        # checked after the walk so a catch-up burst writes at most one
+        if self._state_deltas >= _STATE_DELTAS_PER_SNAPSHOT or (
+            self._state_deltas > 0 and
+            time.monotonic() - self._last_state_snapshot >= _STATE_SNAPSHOT_INTERVAL
+        ):
+            self._save_state_snapshot()
+    
+    def _apply_one(self, proposal_number: int, entry: Dict[str, Any]) -> None:
+        """Apply a single decision to the application state."""
         value = entry['value']
         
         # In a real application, this would apply the value/operation to the state
         self.logger.info(f"Applying decision {proposal_number}: {value}")
         
-        # For this example, we just store the value in our state
-        if isinstance(value, dict) and 'operation' in value:
-            operation = value['operation']
+        # For this example, we just store the value in our state; a batched
+        # slot carries several client operations, applied in order
+        operations = ()
+        if isinstance(value, dict):
+            if 'operations' in value:
+                operations = value['operations']
+            elif 'operation' in value:
+                operations = (value['operation'],)
+        
+        if not isinstance(operations, (list, tuple)):
+            operations = ()
+        
+        for operation in operations:
+            if not isinstance(operation, dict):
+                # Still counts as applied so later slots are not held up
+                self.logger.warning(f"Skipping malformed operation in decision {proposal_number}: {operation}")
+                continue
             if operation.get('type') == 'put':
                 key = operation.get('key')
                 val = operation.get('value')
+                if key not in self.application_state and isinstance(key, str):
+                    self._sorted_keys.add(key)
                 self.application_state[key] = val
+                self._log_state_delta([proposal_number, 'put', key, val])
                 self.logger.info(f"Updated state: {key} = {val}")
             elif operation.get('type') == 'delete':
                 key = operation.get('key')
                 if key in self.application_state:
                     del self.application_state[key]
+                    if isinstance(key, str):
+                        self._sorted_keys.remove(key)
+                    self._log_state_delta([proposal_number, 'del', key])
                     self.logger.info(f"Deleted key: {key}")
         
         # Update last applied
         self.last_applied = proposal_number
-        
-        # Save state snapshot periodically (e.g., every 10 decisions)
-        if proposal_number % 10 == 0:
-            self._save_state_snapshot()
-        
-        # Apply next decisions if they're available and in sequence
-        next_proposal = proposal_number + 1
-        while str(next_proposal) in self.decisions and self.decisions[str(next_proposal)]['is_definitely_decided']:
-            self._apply_decision(next_proposal)
-            next_proposal += 1
     
     def handle_learn(self, learn_msg: Dict[str, Any]) -> Dict[str, Any]:
         """Handle learn message from acceptor."""
+        with self._lock:
+            proposal_number, value = self._record_learn(learn_msg)
+            
+            # Save decisions log
+            self._save_decisions_log([proposal_number])
+        
+        # Check for gaps in sequence
+        self._check_for_gaps()
+        
+        # Notify subscribed clients
+        self._notify_subscribed_clients(proposal_number, value)
+        
+        # Return acknowledgment
+        return {
+            "type": "LEARN_ACK",
+            "learner_id": self.learner_id,
+            "proposal_number": proposal_number,
+            "timestamp": time.time_ns()
+        }
+    
+    def handle_learn_batch(self, batch_msg: Dict[str, Any]) -> Dict[str, Any]:
+        """Handle a batch of learn messages, saving the decisions log once."""
+        with self._lock:
+            learned = [self._record_learn(learn_msg) for learn_msg in batch_msg['messages']]
+            self._save_decisions_log([proposal_number for proposal_number, _ in learned])
+        
+        self._check_for_gaps()
+        
+        for proposal_number, value in learned:
+            self._notify_subscribed_clients(proposal_number, value)
+        
+        return {
+            "type": "LEARN_ACK",
+            "learner_id": self.learner_id,
+            "proposal_numbers": [proposal_number for proposal_number, _ in learned],
+            "timestamp": time.time_ns()
+        }
+    
+    def handle_commit(self, commit_msg: Dict[str, Any]) -> Dict[str, Any]:
+        """Handle a commit from the proposer that saw a quorum of acceptances."""
+        proposal_number = commit_msg['proposal_number']
+        value = commit_msg['value']
+        
+        self.logger.info(f"Received COMMIT({proposal_number}) from proposer {commit_msg.get('proposer_id')}")
+        
+        with self._lock:
+            if proposal_number > self.highest_seen:
+                self.highest_seen = proposal_number
+            
+            entry = self.decisions.get(proposal_number)
+            if entry is None:
+                self.decisions[proposal_number] = self._create_decision_entry(proposal_number, value, None)
+                self._advance_next_gap(proposal_number)
+            else:
+                entry['is_definitely_decided'] = True
+                entry['last_notification'] = time.time()
+            
+            # Apply to application state if this is the next in sequence
+            if (self.last_applied + 1) == proposal_number:
+                self._apply_ready()
+            
+            self._save_decisions_log([proposal_number])
+        
+        # Acked without a peer sync on this thread; _periodic_sync fills gaps
+        self._notify_subscribed_clients(proposal_number, value)
+        
+        return {
+            "type": "COMMIT_ACK",
+            "learner_id": self.learner_id,
+            "proposal_number": proposal_number,
+            "timestamp": time.time_ns()
+        }
+    
+    def _record_learn(self, learn_msg: Dict[str, Any]) -> Tuple[int, Any]:
+        """Record one LEARN in the decisions table and return its number and value."""
         proposal_number = learn_msg['proposal_number']
         value = learn_msg['value']
         acceptor_id = learn_msg['acceptor_id']
@@ -201,46 +543,36 @@ class Learner:
             self.highest_seen = proposal_number
         
         # Check if we already know about this proposal
-        if str(proposal_number) in self.decisions:
+        if proposal_number in self.decisions:
             # Update existing entry
             self._update_decision_entry(proposal_number, acceptor_id)
         else:
             # Create new entry
-            self.decisions[str(proposal_number)] = self._create_decision_entry(
+            self.decisions[proposal_number] = self._create_decision_entry(
                 proposal_number, value, acceptor_id
             )
+            self._advance_next_gap(proposal_number)
         
-        # Save decisions log
-        self._save_decisions_log()
-        
-        # Check for gaps in sequence
-        self._check_for_gaps()
-        
-        # Notify subscribed clients
-        self._notify_subscribed_clients(proposal_number, value)
-        
-        # Return acknowledgment
-        return {
-            "type": "LEARN_ACK",
-            "learner_id": self.learner_id,
-            "proposal_number": proposal_number,
-            "timestamp": time.time()
-        }
+        return proposal_number, value
+    
+    def _advance_next_gap(self, proposal_number: int) -> None:
+        """Move the next-gap pointer past a newly filled proposal number."""
+        if proposal_number == self._next_gap:
+            while self._next_gap in self.decisions:
+                self._next_gap += 1
     
     def _check_for_gaps(self) -> None:
         """Check for gaps in the decision sequence and try to fill them."""
-        if not self.decisions:
-            return
-        
-        # Find gaps between last_applied and highest_seen
-        next_expected = self.last_applied + 1
-        
-        while next_expected <= self.highest_seen:
-            if str(next_expected) not in self.decisions:
-                self.logger.info(f"Detected gap at proposal {next_expected}, requesting sync")
-                self._request_sync(next_expected, self.highest_seen)
-                break
-            next_expected += 1
+        with self._lock:
+            # Any hole between last_applied and highest_seen starts at the pointer
+            gap = None
+            if self._next_gap <= self.highest_seen:
+                gap = (self._next_gap, self.highest_seen)
+        
+        # Sync over HTTP without holding the lock
+        if gap:
+            self.logger.info(f"Detected gap at proposal {gap[0]}, requesting sync")
+            self._request_sync(*gap)
     
     def _request_sync(self, from_seq: int, to_seq: int) -> None:
         """Request synchronization from other learners for missing decisions."""
@@ -254,19 +586,41 @@ class Learner:
             learner_id=self.learner_id
         )
         
-        # Try to sync from other learners
-        for host, port in self.other_learners:
-            try:
-                url = f"http://{host}:{port}/sync"
-                response = requests.post(url, json=sync_request.to_dict(), timeout=5)
+        payload = sync_request.to_dict()
+        fetches = {
+            self._sync_pool.submit(self._fetch_sync, host, port, payload): (host, port)
+            for host, port in self.other_learners
+        }
+        
+        try:
+            # Use the first peer that answers; the slowest ones are never waited on
+            for fetch in as_completed(fetches):
+                host, port = fetches[fetch]
+                try:
+                    sync_response = fetch.result()
+                except Exception as e:
+                    self.logger.warning(f"Failed to request sync from learner at {host}:{port}: {e}")
+                    continue
                 
-                if response.status_code == 200:
-                    sync_response = response.json()
-                    if sync_response['type'] == SYNC_RESPONSE:
-                        self._handle_sync_response(sync_response)
-                        break
-            except Exception as e:
-                self.logger.warning(f"Failed to request sync from learner at {host}:{port}: {e}")
+                if sync_response is not None:
+                    self._handle_sync_response(sync_response)
+                    return
+        finally:
+            # Requests still queued are no longer needed
+            for fetch in fetches:
+                fetch.cancel()
+    
+    def _fetch_sync(self, host: str, port: int, payload: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """POST a sync request to a peer, or None if it did not answer with a sync response."""
+        url = f"http://{host}:{port}/sync"
+        # Encoded with orjson up front rather than through requests' json=
+        response = self._session.post(url, data=orjson.dumps(payload), headers=JSON_HEADERS, timeout=5)
+        if response.status_code != 200:
+            return None
+        sync_response = orjson.loads(response.content)
+        if sync_response.get('type') != SYNC_RESPONSE:
+            return None
+        return sync_response
     
     def _handle_sync_response(self, sync_response: Dict[str, Any]) -> None:
         """Handle synchronization response from another learner."""
@@ -277,25 +631,29 @@ class Learner:
                         f"with {len(decisions)} decisions")
         
         # Update our decisions with the synced ones
-        for decision in decisions:
-            proposal_number = decision['proposal_number']
-            
-            if str(proposal_number) not in self.decisions:
-                self.decisions[str(proposal_number)] = decision
+        with self._lock:
+            added = []
+            for decision in decisions:
+                proposal_number = decision['proposal_number']
+                
+                if proposal_number not in self.decisions:
+                    self.decisions[proposal_number] = _upgrade_entry(decision)
+                    added.append(proposal_number)
+                    self._advance_next_gap(proposal_number)
+                    
+                    # If this decision has a quorum and is the next one we need, apply it
+                    if (decision['is_definitely_decided'] and 
+                        proposal_number == (self.last_applied + 1)):
+                        self._apply_ready()
                 
-                # If this decision has a quorum and is the next one we need, apply it
-                if (decision['is_definitely_decided'] and 
-                    proposal_number == (self.last_applied + 1)):
-                    self._apply_decision(proposal_number)
+                if proposal_number > self.highest_seen:
+                    self.highest_seen = proposal_number
             
-            if proposal_number > self.highest_seen:
-                self.highest_seen = proposal_number
+            # Save updated decisions log
+            self._save_decisions_log(added)
         
-        # Save updated decisions log
-        self._save_decisions_log()
-        
-        # Check if we still have gaps
-        self._check_for_gaps()
+        # Gaps still left are retried by _periodic_sync rather than by
+        # recursing here: proposal numbers are sparse, so some never close
     
     def handle_sync_request(self, sync_request: Dict[str, Any]) -> Dict[str, Any]:
         """Handle synchronization request from another learner."""
@@ -307,10 +665,15 @@ class Learner:
                         f"for proposals {from_seq} to {to_seq}")
         
         # Collect the requested decisions
-        requested_decisions = []
-        for seq in range(from_seq, to_seq + 1):
-            if str(seq) in self.decisions:
-                requested_decisions.append(self.decisions[str(seq)])
+        # Proposal numbers are sparse, so walk whichever of the range and
+        # the decision table is smaller
+        with self._lock:
+            if to_seq - from_seq >= len(self.decisions):
+                requested_decisions = [self.decisions[seq] for seq in sorted(self.decisions)
+                                       if from_seq <= seq <= to_seq]
+            else:
+                requested_decisions = [self.decisions[seq] for seq in range(from_seq, to_seq + 1)
+                                       if seq in self.decisions]
         
         # Create and return sync response
         sync_response = SyncResponseMessage(
@@ -333,22 +696,28 @@ class Learner:
         # Determine result based on query type
         result = None
         
-        if 'key' in query:
-            key = query['key']
-            result = self.application_state.get(key)
-        elif query.get('type') == 'all':
-            result = self.application_state.copy()
-        elif query.get('type') == 'prefix':
-            prefix = query.get('prefix', '')
-            result = {k: v for k, v in self.application_state.items() if k.startswith(prefix)}
+        with self._lock:
+            if 'key' in query:
+                key = query['key']
+                result = self.application_state.get(key)
+            elif query.get('type') == 'all':
+                result = self.application_state.copy()
+            elif query.get('type') == 'prefix':
+                prefix = query.get('prefix', '')
+                result = {}
+                for k in self._sorted_keys.irange(prefix):
+                    if not k.startswith(prefix):
+                        break
+                    result[k] = self.application_state[k]
+            sequence_number = self.last_applied
         
         # Create read response
         read_response = ReadResponseMessage(
             type="READ_RESPONSE",
             request_id=request_id,
             result=result,
-            sequence_number=self.last_applied,
-            timestamp=time.time()
+            sequence_number=sequence_number,
+            timestamp=time.time_ns()
         )
         
         return read_response.to_dict()
@@ -363,15 +732,23 @@ class Learner:
         
         self.logger.info(f"Received SUBSCRIBE from client {client_id}, patterns={interest_patterns}")
         
+        # Patterns are regular expressions searched for in each decided value's
+        # JSON encoding; compiling here also rejects invalid ones up front
+        matcher = _compile_patterns(interest_patterns)
+        
         # Store subscription
-        self.subscriptions[subscription_id] = {
+        subscription = {
             'subscription_id': subscription_id,
             'client_id': client_id,
             'interest_patterns': interest_patterns,
+            'matcher': matcher,
             'options': options,
             'created_at': time.time(),
-            'last_notification': time.time()
+            'last_notification': time.monotonic()
         }
+        stripe = self._sub_stripe(subscription_id)
+        with self._sub_locks[stripe]:
+            self._subscriptions[stripe][subscription_id] = subscription
         
         # Return confirmation
         return {
@@ -392,11 +769,12 @@ class Learner:
                         f"subscription={subscription_id}")
         
         # Remove subscription if exists
-        if subscription_id in self.subscriptions:
-            del self.subscriptions[subscription_id]
-            status = "success"
-        else:
-            status = "not_found"
+        stripe = self._sub_stripe(subscription_id)
+        with self._sub_locks[stripe]:
+            if self._subscriptions[stripe].pop(subscription_id, None) is not None:
+                status = "success"
+            else:
+                status = "not_found"
         
         # Return confirmation
         return {
@@ -405,39 +783,60 @@ class Learner:
             "status": status
         }
     
+    def _sub_stripe(self, subscription_id: str) -> int:
+        """Index of the subscription stripe holding this id."""
+        return hash(subscription_id) & (_SUBSCRIPTION_STRIPES - 1)
+    
+    def _subscription_count(self) -> int:
+        """Number of active subscriptions across all stripes."""
+        return sum(len(stripe) for stripe in self._subscriptions)
+    
     def _notify_subscribed_clients(self, proposal_number: int, value: Any) -> None:
         """Notify subscribed clients about new decisions."""
         # In a real implementation, this would send notifications to subscribed clients
         # For this example, we just log the notification
-        if not self.subscriptions:
+        if not self._subscription_count():
             return
         
-        self.logger.info(f"Would notify {len(self.subscriptions)} subscribed clients "
-                        f"about proposal {proposal_number}")
-        
-        # Check which subscriptions match this value
-        for sub_id, subscription in self.subscriptions.items():
-            # Check if this value matches any interest patterns
-            # For simplicity, we're not implementing actual pattern matching here
-            
-            # Update last notification time
-            subscription['last_notification'] = time.time()
+        # Encode the value once for every subscription's matcher
+        payload = orjson.dumps(value, option=orjson.OPT_NON_STR_KEYS)
+        
+        # Check which subscriptions match this value, one stripe at a time
+        now = time.monotonic()
+        matched = 0
+        for lock, stripe in zip(self._sub_locks, self._subscriptions):
+            if not stripe:
+                continue
+            with lock:
+                for sub_id, subscription in stripe.items():
+                    matcher = subscription['matcher']
+                    if matcher is not None and matcher.search(payload) is None:
+                        continue
+                    matched += 1
+                    
+                    # Update last notification time
+                    subscription['last_notification'] = now
+        
+        if matched:
+            self.logger.info(f"Would notify {matched} subscribed clients "
+                            f"about proposal {proposal_number}")
     
     def _periodic_sync(self) -> None:
         """Periodically synchronize with other learners and check for gaps."""
-        while not self.stop_threads:
+        while not self._stop_evt.is_set():
             try:
                 # Check for gaps every 5 seconds
                 self._check_for_gaps()
                 
                 # Perform consistency check with other learners occasionally
-                if random.random() < 0.1:  # 10% chance each cycle
+                self._sync_ticks += 1
+                if self._sync_ticks % 10 == 0:  # Every 10th cycle
                     self._check_consistency_with_others()
-                
-                time.sleep(5)
             except Exception as e:
                 self.logger.error(f"Error in periodic sync: {e}")
-                time.sleep(5)  # Back off on error
+            
+            # Waits out the interval (also after errors) but returns at once on stop()
+            self._stop_evt.wait(5)
     
     def _check_consistency_with_others(self) -> None:
         """Check consistency with other learners."""
@@ -454,6 +853,6 @@ class Learner:
             "highest_seen": self.highest_seen,
             "total_decisions": len(self.decisions),
             "state_size": len(self.application_state),
-            "active_subscriptions": len(self.subscriptions),
+            "active_subscriptions": self._subscription_count(),
             "quorum_size": self.quorum_size
         }
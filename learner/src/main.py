@@ -4,13 +4,19 @@ Main entry point for Learner service.
 
 import os
 import json
+import time
 import atexit
 import random
-from flask import Flask, request, jsonify
+import orjson
+from flask import Flask, Response, request
+from werkzeug.exceptions import HTTPException
+from waitress import serve
 
 from learner import Learner
-from common.utils import setup_logger, parse_hosts
-from common.constants import get_quorum_size
+from common.utils import (
+    setup_logger, parse_hosts, unpack_message, unpack_learns, LEARN_MIMETYPE
+)
+from common.constants import BATCH, get_quorum_size
 
 # Get environment variables
 LEARNER_ID = os.environ.get('LEARNER_ID', '1')
@@ -21,6 +27,7 @@ OTHER_LEARNERS_STR = os.environ.get('OTHER_LEARNERS', None)
 TOTAL_ACCEPTORS = int(os.environ.get('TOTAL_ACCEPTORS', 3))
 QUORUM_SIZE = int(os.environ.get('QUORUM_SIZE', get_quorum_size(TOTAL_ACCEPTORS)))
 DATA_DIR = os.environ.get('DATA_DIR', '/data')
+SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 16))
 
 # Parse hosts
 ACCEPTOR_HOSTS = parse_hosts(ACCEPTOR_HOSTS_STR)
@@ -49,10 +56,27 @@ learner = Learner(LEARNER_ID, DATA_DIR, ACCEPTOR_HOSTS, OTHER_LEARNERS, TOTAL_AC
 # Register shutdown function
 atexit.register(lambda: learner.stop())
 
+def read_json():
+    """Parse the request body with orjson."""
+    return orjson.loads(request.get_data(cache=False))
+
+def json_response(payload, status=200):
+    """Build a JSON response with orjson instead of jsonify."""
+    return Response(orjson.dumps(payload, option=orjson.OPT_NON_STR_KEYS), status=status, mimetype='application/json')
+
+@app.errorhandler(Exception)
+def handle_error(e):
+    """Log an unhandled error and answer with a JSON 500."""
+    # Routing errors such as 404/405 keep their own status
+    if isinstance(e, HTTPException):
+        return e
+    logger.error(f"Error handling {request.method} {request.path}: {e}")
+    return json_response({"error": str(e)}, 500)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
-    return jsonify({
+    return json_response({
         "status": "ok", 
         "learner_id": LEARNER_ID,
         "last_applied": learner.last_applied,
@@ -62,91 +86,99 @@ def health_check():
 @app.route('/status', methods=['GET'])
 def status():
     """Get learner status."""
-    try:
-        status_info = learner.get_status()
-        return jsonify(status_info)
-    except Exception as e:
-        logger.error(f"Error getting status: {e}")
-        return jsonify({"error": str(e)}), 500
+    status_info = learner.get_status()
+    return json_response(status_info)
 
 @app.route('/learn', methods=['POST'])
 def learn():
     """Handle learn messages from acceptors."""
-    try:
-        data = request.json
-        logger.debug(f"Received learn message: {data}")
-        
+    body = request.get_data(cache=False)
+    if request.content_type and request.content_type.startswith(LEARN_MIMETYPE):
+        learn_msgs = unpack_learns(body)
+        if len(learn_msgs) == 1:
+            data = learn_msgs[0]
+        else:
+            data = {"type": BATCH, "messages": learn_msgs}
+    else:
+        data = unpack_message(body, request.content_type)
+    logger.debug(f"Received learn message: {data}")
+    
+    if data.get('type') == BATCH:
+        response = learner.handle_learn_batch(data)
+    else:
         response = learner.handle_learn(data)
-        return jsonify(response)
-    except Exception as e:
-        logger.error(f"Error handling learn message: {e}")
-        return jsonify({"error": str(e)}), 500
+    return json_response(response)
+
+@app.route('/learn_batch', methods=['POST'])
+def learn_batch():
+    """Handle an array of learn messages, saving the decisions log once."""
+    body = request.get_data(cache=False)
+    if request.content_type and request.content_type.startswith(LEARN_MIMETYPE):
+        data = {"type": BATCH, "messages": unpack_learns(body)}
+    else:
+        data = unpack_message(body, request.content_type)
+    logger.debug(f"Received learn batch of {len(data['messages'])} messages")
+    
+    response = learner.handle_learn_batch(data)
+    return json_response(response)
+
+@app.route('/commit', methods=['POST'])
+def commit():
+    """Handle commit messages from the proposer that reached an accept quorum."""
+    data = unpack_message(request.get_data(cache=False), request.content_type)
+    logger.debug(f"Received commit message: {data}")
+    
+    response = learner.handle_commit(data)
+    return json_response(response)
 
 @app.route('/sync', methods=['POST'])
 def sync():
     """Handle synchronization requests from other learners."""
-    try:
-        data = request.json
-        logger.debug(f"Received sync request: {data}")
-        
-        response = learner.handle_sync_request(data)
-        return jsonify(response)
-    except Exception as e:
-        logger.error(f"Error handling sync request: {e}")
-        return jsonify({"error": str(e)}), 500
+    data = read_json()
+    logger.debug(f"Received sync request: {data}")
+    
+    response = learner.handle_sync_request(data)
+    return json_response(response)
 
 @app.route('/read', methods=['POST'])
 def read():
     """Handle read requests from clients."""
-    try:
-        data = request.json
-        logger.debug(f"Received read request: {data}")
-        
-        response = learner.handle_read_request(data)
-        return jsonify(response)
-    except Exception as e:
-        logger.error(f"Error handling read request: {e}")
-        return jsonify({"error": str(e)}), 500
+    data = read_json()
+    logger.debug(f"Received read request: {data}")
+    
+    response = learner.handle_read_request(data)
+    return json_response(response)
 
 @app.route('/subscribe', methods=['POST'])
 def subscribe():
     """Handle subscription requests from clients."""
-    try:
-        data = request.json
-        logger.debug(f"Received subscribe request: {data}")
-        
-        response = learner.handle_subscribe(data)
-        return jsonify(response)
-    except Exception as e:
-        logger.error(f"Error handling subscribe request: {e}")
-        return jsonify({"error": str(e)}), 500
+    data = read_json()
+    logger.debug(f"Received subscribe request: {data}")
+    
+    response = learner.handle_subscribe(data)
+    return json_response(response)
 
 @app.route('/unsubscribe', methods=['POST'])
 def unsubscribe():
     """Handle unsubscribe requests from clients."""
-    try:
-        data = request.json
-        logger.debug(f"Received unsubscribe request: {data}")
-        
-        response = learner.handle_unsubscribe(data)
-        return jsonify(response)
-    except Exception as e:
-        logger.error(f"Error handling unsubscribe request: {e}")
-        return jsonify({"error": str(e)}), 500
+    data = read_json()
+    logger.debug(f"Received unsubscribe request: {data}")
+    
+    response = learner.handle_unsubscribe(data)
+    return json_response(response)
 
 @app.route('/state', methods=['GET'])
 def get_state():
     """Get current application state."""
-    try:
-        return jsonify({
-            "state": learner.application_state,
-            "version": learner.last_applied,
-            "timestamp": time.time()
-        })
-    except Exception as e:
-        logger.error(f"Error getting application state: {e}")
-        return jsonify({"error": str(e)}), 500
+    return json_response({
+        "state": learner.application_state,
+        "version": learner.last_applied,
+        "timestamp": time.time()
+    })
 
 if __name__ == '__main__':
     logger.info(f"Starting Learner {LEARNER_ID} on port {LEARNER_PORT}")
-    app.run(host='0.0.0.0', port=LEARNER_PORT, debug=False)
+    # Threaded WSGI server so LEARN fan-in from every acceptor, peer syncs and
+    # client reads are served concurrently; one process keeps a single learner
+    setup_logger('waitress')
+    serve(app, host='0.0.0.0', port=LEARNER_PORT, threads=SERVER_THREADS)
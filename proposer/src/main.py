@@ -3,9 +3,12 @@ Main entry point for Proposer service.
 """
 
 import os
-import json
+import time
 import atexit
-from flask import Flask, request, jsonify
+import orjson
+from flask import Flask, Response, request
+from werkzeug.exceptions import HTTPException
+from waitress import serve
 
 from proposer import Proposer
 from common.utils import setup_logger, parse_hosts
@@ -17,6 +20,7 @@ ACCEPTOR_HOSTS_STR = os.environ.get('ACCEPTOR_HOSTS', 'acceptor1:5001,acceptor2:
 LEARNER_HOSTS_STR = os.environ.get('LEARNER_HOSTS', 'learner1:7001,learner2:7002')
 HEARTBEAT_INTERVAL = int(os.environ.get('HEARTBEAT_INTERVAL', 500))  # in ms
 LEADER_TIMEOUT = int(os.environ.get('LEADER_TIMEOUT', 1500))  # in ms
+SERVER_THREADS = int(os.environ.get('SERVER_THREADS', 16))
 
 # Parse hosts
 ACCEPTOR_HOSTS = parse_hosts(ACCEPTOR_HOSTS_STR)
@@ -33,10 +37,27 @@ proposer = Proposer(PROPOSER_ID, ACCEPTOR_HOSTS, LEARNER_HOSTS,
 # Register shutdown function
 atexit.register(lambda: proposer.stop())
 
+def read_json():
+    """Parse the request body with orjson."""
+    return orjson.loads(request.get_data(cache=False))
+
+def json_response(payload, status=200):
+    """Build a JSON response with orjson instead of jsonify."""
+    return Response(orjson.dumps(payload), status=status, mimetype='application/json')
+
+@app.errorhandler(Exception)
+def handle_error(e):
+    """Log an unhandled error and answer with a JSON 500."""
+    # Routing errors such as 404/405 keep their own status
+    if isinstance(e, HTTPException):
+        return e
+    logger.error(f"Error handling {request.method} {request.path}: {e}")
+    return json_response({"error": str(e)}, 500)
+
 @app.route('/health', methods=['GET'])
 def health_check():
     """Health check endpoint."""
-    return jsonify({
+    return json_response({
         "status": "ok", 
         "proposer_id": PROPOSER_ID,
         "state": proposer.state,
@@ -46,48 +67,45 @@ def health_check():
 @app.route('/status', methods=['GET'])
 def status():
     """Get proposer status."""
-    try:
-        status_info = {
-            "proposer_id": PROPOSER_ID,
-            "state": proposer.state,
-            "leader_id": proposer.leader_id,
-            "is_leader": proposer.state == "LEADER",
-            "last_heartbeat": proposer.last_heartbeat,
-            "active_proposals": len(proposer.active_proposals),
-            "queued_proposals": len(proposer.proposal_queue)
-        }
-        return jsonify(status_info)
-    except Exception as e:
-        logger.error(f"Error getting status: {e}")
-        return jsonify({"error": str(e)}), 500
+    status_info = {
+        "proposer_id": PROPOSER_ID,
+        "state": proposer.state,
+        "leader_id": proposer.leader_id,
+        "is_leader": proposer.state == "LEADER",
+        # Seconds since the last leader heartbeat; None until one is seen
+        "last_heartbeat_age": (time.monotonic() - proposer.last_heartbeat
+                               if proposer.last_heartbeat else None),
+        "active_proposals": len(proposer.active_proposals),
+        "queued_proposals": proposer.proposal_queue.qsize()
+    }
+    return json_response(status_info)
 
 @app.route('/request', methods=['POST'])
 def handle_request():
     """Handle client requests."""
     try:
-        data = request.json
+        data = read_json()
         logger.debug(f"Received client request: {data}")
         
         response = proposer.handle_client_request(data)
-        return jsonify(response)
+        return json_response(response)
     except Exception as e:
         logger.error(f"Error handling client request: {e}")
-        return jsonify({
+        return json_response({
             "type": "ERROR",
             "request_id": data.get('request_id') if 'data' in locals() else None,
             "error": str(e)
-        }), 500
+        }, 500)
 
 @app.route('/prepare_test', methods=['POST'])
 def prepare_test():
     """Test endpoint to manually trigger prepare phase."""
-    try:
-        proposer._start_election()
-        return jsonify({"status": "prepare_started"})
-    except Exception as e:
-        logger.error(f"Error starting prepare test: {e}")
-        return jsonify({"error": str(e)}), 500
+    proposer._start_election()
+    return json_response({"status": "prepare_started"})
 
 if __name__ == '__main__':
     logger.info(f"Starting Proposer {PROPOSER_ID} on port {PROPOSER_PORT}")
-    app.run(host='0.0.0.0', port=PROPOSER_PORT, debug=False)
+    # Threaded WSGI server so client writes and status polls don't queue
+    # behind each other; one process keeps a single proposer
+    setup_logger('waitress')
+    serve(app, host='0.0.0.0', port=PROPOSER_PORT, threads=SERVER_THREADS)
@@ -4,26 +4,110 @@ Proposer component implementation for Paxos protocol.
 
 import os
 import time
-import json
 import uuid
 import random
+import queue
 import threading
-from typing import Dict, Any, List, Optional, Tuple
-from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Callable, Dict, Any, Iterator, List, Optional, Tuple, Union
 
+import msgpack
 import requests
+from msgspec import Struct, field
+from requests.adapters import HTTPAdapter
+from urllib3.util import SKIP_HEADER
 
 from common.constants import (
     FOLLOWER, CANDIDATE, LEADER,
     PREPARE, ACCEPT, HEARTBEAT,
-    PROMISE, NOT_PROMISE, ACCEPTED, NOT_ACCEPTED,
-    WRITE_REQUEST, STATUS_REQUEST
+    PROMISE, NOT_PROMISE, ACCEPTED, NOT_ACCEPTED, COMMIT,
+    WRITE_REQUEST, STATUS_REQUEST, MAX_WRITE_BATCH, MAX_WRITE_BATCH_MS, COMMIT_FALLBACK_MS
 )
 from common.message import (
-    PrepareMessage, AcceptMessage, HeartbeatMessage,
+    PrepareMessage, HeartbeatMessage, CommitMessage,
     WriteResponseMessage, RedirectMessage, StatusResponseMessage
 )
-from common.utils import setup_logger, parse_hosts, calculate_backoff
+from common.utils import (
+    setup_logger, parse_hosts, calculate_backoff,
+    pack_message, unpack_message, pack_heartbeat_lite, MSGPACK_HEADERS, HEARTBEAT_LITE_HEADERS
+)
+
+# Proposals (elections included) still tracked this long after they were
+# started are given up by the reaper
+_PROPOSAL_EXPIRY = 10.0  # seconds
+_REAP_INTERVAL = 0.5  # seconds
+
+# STATUS_REQUEST answers share one status snapshot for this long
+_STATUS_TTL = 0.01  # seconds
+
+# Packed keys of the per-proposal entries appended to the ACCEPT prefix
+_PROPOSAL_NUMBER_KEY = msgpack.packb('proposal_number')
+_VALUE_KEY = msgpack.packb('value')
+_COMMITTED_KEY = msgpack.packb('committed')
+_TIMESTAMP_KEY = msgpack.packb('timestamp')
+
+
+class _Proposal(Struct, eq=False, gc=False):
+    """Tracking state of one in-flight proposal.
+    
+    Responses are only counted; of the promises just the highest accepted
+    proposal and its value are kept, since that is all phase 2 needs.
+    """
+    value: Any = None
+    promise_count: int = 0
+    accept_count: int = 0
+    highest_accepted: int = 0
+    accepted_value: Any = None
+    client_requests: Optional[List[Dict[str, Any]]] = None
+    created_at: float = field(default_factory=time.monotonic)
+
+
+class _CommitReports:
+    """Commit reports still owed to each acceptor.
+    
+    Every acceptor gets its own copy of each report and keeps it until a
+    message carrying it got through, so a skipped heartbeat or a failed
+    ACCEPT is made up by the next message to that acceptor. Reports older
+    than `max_age` are dropped: by then the acceptor has broadcast the held
+    LEARN anyway, which also bounds what a dead acceptor piles up.
+    """
+    
+    def __init__(self, acceptor_hosts: List[Tuple[str, int]], max_age: float):
+        self._max_age = max_age
+        self._lock = threading.Lock()
+        # (host, port) -> [(monotonic time, report)], oldest first, and the
+        # running index of its first entry so deliveries can be matched up
+        self._entries = {host: [] for host in acceptor_hosts}
+        self._base = dict.fromkeys(acceptor_hosts, 0)
+    
+    def add(self, report: Any) -> None:
+        """Owe a report to every acceptor."""
+        entry = (time.monotonic(), report)
+        with self._lock:
+            for entries in self._entries.values():
+                entries.append(entry)
+    
+    def pending(self, host: Tuple[str, int]) -> Tuple[int, List[Any]]:
+        """Reports still owed to `host`, and the mark to pass to delivered()."""
+        with self._lock:
+            entries = self._entries[host]
+            expired = 0
+            oldest = time.monotonic() - self._max_age
+            while expired < len(entries) and entries[expired][0] < oldest:
+                expired += 1
+            if expired:
+                del entries[:expired]
+                self._base[host] += expired
+            return self._base[host] + len(entries), [report for _, report in entries]
+    
+    def delivered(self, host: Tuple[str, int], mark: int) -> None:
+        """Forget the reports `host` has taken, up to a mark from pending()."""
+        with self._lock:
+            # Sends to one acceptor overlap; a later mark may already be in
+            delivered = mark - self._base[host]
+            if delivered > 0:
+                del self._entries[host][:delivered]
+                self._base[host] = mark
 
 
 class Proposer:
@@ -36,6 +120,7 @@ class Proposer:
         self.proposer_id = proposer_id
         self.acceptor_hosts = acceptor_hosts
         self.learner_hosts = learner_hosts
+        self.quorum_size = (len(acceptor_hosts) // 2) + 1  # Acceptor set is fixed for the process lifetime
         self.heartbeat_interval = heartbeat_interval / 1000.0  # Convert to seconds
         self.leader_timeout = leader_timeout / 1000.0  # Convert to seconds
         
@@ -45,58 +130,125 @@ class Proposer:
         self.state = FOLLOWER
         self.counter = 0  # Local counter for proposal numbers
         self.leader_id = None
-        self.last_heartbeat = 0
+        self.last_heartbeat = 0  # time.monotonic() of the last heartbeat from a leader
         self.heartbeat_sequence = 0
         
+        # One heartbeat message reused every tick; only the sequence and time change
+        self._heartbeat_msg = HeartbeatMessage(
+            type=HEARTBEAT,
+            leader_id=proposer_id,
+            sequence_number=0,
+            timestamp=0
+        )
+        self._full_heartbeat_needed = True  # Full message once per leadership, lite after
+        
+        # ACCEPT bodies are the AcceptMessage fields as a msgpack map; the
+        # header, type, proposer_id and commit_target never change, so they
+        # are packed once and each accept only packs its own entries
+        self._accept_packer = msgpack.Packer(use_bin_type=True)
+        self._accept_pack_lock = threading.Lock()  # Packer buffers aren't thread-safe
+        self._accept_prefix = b''.join((
+            self._accept_packer.pack_map_header(7),
+            msgpack.packb('type'), msgpack.packb(ACCEPT),
+            msgpack.packb('proposer_id'), msgpack.packb(proposer_id),
+            # With learners to commit to, acceptors leave the LEARN broadcast to us
+            msgpack.packb('commit_target'), msgpack.packb(proposer_id if learner_hosts else None),
+        ))
+        
+        # Proposals whose COMMIT round finished, with the learners that acked
+        # it when not all did; reported to each acceptor on its next ACCEPT or
+        # heartbeat so it drops its held LEARNs, or sends them only to the
+        # learners that missed the COMMIT
+        self._commit_reports = _CommitReports(acceptor_hosts, COMMIT_FALLBACK_MS / 1000.0)
+        
+        # Shared by every fan-out thread so each acceptor keeps warm keep-alive
+        # connections instead of a new TCP handshake per message
+        self._session = requests.Session()
+        self._session.mount('http://', HTTPAdapter(pool_connections=32, pool_maxsize=32))
+        # Acceptors and learners ignore User-Agent, Accept and Accept-Encoding;
+        # without them a request carries just Host, Content-Type and Content-Length
+        self._session.headers.clear()
+        self._session.headers.update({'User-Agent': SKIP_HEADER, 'Accept-Encoding': SKIP_HEADER})
+        
+        # Acceptors are contacted in parallel; sized so heartbeats and a broadcast
+        # started from a response handler (PREPARE quorum -> ACCEPT) can run
+        # while an earlier broadcast still waits on a slow acceptor
+        self._rpc_pool = ThreadPoolExecutor(max_workers=max(4, 3 * len(acceptor_hosts)),
+                                            thread_name_prefix=f"proposer-{proposer_id}-rpc")
+        self._heartbeat_calls = {}  # (host, port) -> Future of the last heartbeat sent
+        
         # For Multi-Paxos optimization
         self.is_preparing = False
         self.prepare_quorum_achieved = False
         
+        # Guards state, counter, is_preparing and active_proposals, which the
+        # background loops, RPC threads and HTTP handlers all touch; never held
+        # across a broadcast
+        self._lock = threading.RLock()
+        self._leader_ready = threading.Event()  # Set while we lead with a prepare quorum
+        
+        # Consecutive lost rounds; the random wait before the next attempt
+        # doubles with each so dueling proposers drift apart
+        self._failed_elections = 0
+        self._preempted_accepts = 0
+        
         # Proposal queue and tracking
-        self.proposal_queue = deque()
-        self.active_proposals = {}  # proposal_number -> {'value': v, 'promises': [], 'accepts': []}
+        self.proposal_queue = queue.SimpleQueue()
+        self.active_proposals = {}  # proposal_number -> _Proposal, oldest first
+        self._election_number = None  # Proposal number of the latest election
+        
+        # (monotonic time taken, status_info) of the last STATUS_REQUEST snapshot
+        self._status_cache = (0.0, None)
         
         # Start background threads
         self.stop_threads = False
+        self._stop_evt = threading.Event()  # Wakes the background loops early on stop()
         self.heartbeat_thread = threading.Thread(target=self._heartbeat_loop)
         self.election_thread = threading.Thread(target=self._election_monitor)
         self.proposal_thread = threading.Thread(target=self._proposal_processor)
+        self.reaper_thread = threading.Thread(target=self._reap_loop)
         
         self.heartbeat_thread.daemon = True
         self.election_thread.daemon = True
         self.proposal_thread.daemon = True
+        self.reaper_thread.daemon = True
         
         self.heartbeat_thread.start()
         self.election_thread.start()
         self.proposal_thread.start()
+        self.reaper_thread.start()
         
         self.logger.info(f"Proposer {proposer_id} initialized")
     
     def stop(self):
         """Stop the proposer background threads."""
         self.stop_threads = True
+        self._stop_evt.set()
+        self.proposal_queue.put(None)  # Unblocks the proposal processor
         self.heartbeat_thread.join(timeout=2)
         self.election_thread.join(timeout=2)
         self.proposal_thread.join(timeout=2)
+        self.reaper_thread.join(timeout=2)
+        self._rpc_pool.shutdown(wait=False)
+        self._session.close()
         self.logger.info("Proposer stopped")
     
     def _generate_proposal_number(self) -> int:
         """Generate a unique proposal number."""
-        self.counter += 1
-        # Format: counter * 100 + ID to ensure uniqueness across proposers
-        return (self.counter * 100) + int(self.proposer_id)
-    
-    def _calculate_quorum_size(self) -> int:
-        """Calculate the quorum size based on the number of acceptors."""
-        return (len(self.acceptor_hosts) // 2) + 1
+        with self._lock:
+            self.counter += 1
+            # Format: counter * 100 + ID to ensure uniqueness across proposers
+            return (self.counter * 100) + int(self.proposer_id)
     
     def _heartbeat_loop(self):
         """Loop to send heartbeats when leader."""
         while not self.stop_threads:
             try:
-                if self.state == LEADER:
-                    self._send_heartbeat()
-                time.sleep(self.heartbeat_interval)
+                # Idle on the leadership event while following
+                if not self._leader_ready.wait(1.0):
+                    continue
+                self._send_heartbeat()
+                self._stop_evt.wait(self.heartbeat_interval)
             except Exception as e:
                 self.logger.error(f"Error in heartbeat loop: {e}")
     
@@ -104,23 +256,36 @@ class Proposer:
         """Monitor for leader failures and initiate elections."""
         while not self.stop_threads:
             try:
-                current_time = time.time()
+                timeout = self.leader_timeout
                 
-                # If we're not the leader and haven't heard from a leader
-                if (self.state != LEADER and 
-                    (current_time - self.last_heartbeat) > self.leader_timeout and
-                    not self.is_preparing):
-                    
-                    self.logger.info(f"Leader timeout detected. Last heartbeat: "
-                                    f"{current_time - self.last_heartbeat:.2f}s ago")
-                    
-                    # Add some jitter to avoid all proposers starting election simultaneously
-                    jitter = random.uniform(0, 1.0)
-                    time.sleep(jitter)
-                    
-                    self._start_election()
+                if self.state == LEADER:
+                    # Nothing to watch while we lead
+                    self._stop_evt.wait(timeout)
+                    continue
+                
+                if self.is_preparing:
+                    # An election is in flight; check back shortly for its outcome
+                    self._stop_evt.wait(0.1)
+                    continue
+                
+                # Sleep until the leader could time out
+                current_time = time.monotonic()
+                remaining = timeout - (current_time - self.last_heartbeat)
+                if remaining > 0:
+                    self._stop_evt.wait(remaining)
+                    continue
+                
+                # We're not the leader and haven't heard from a leader
+                self.logger.info(f"Leader timeout detected. Last heartbeat: "
+                                f"{current_time - self.last_heartbeat:.2f}s ago")
                 
-                time.sleep(0.1)  # Check frequently but not constantly
+                # Add some jitter to avoid all proposers starting election simultaneously,
+                # widening it after every election that failed
+                jitter = random.uniform(0, calculate_backoff(self._failed_elections, base_ms=1000))
+                if self._stop_evt.wait(jitter):
+                    continue
+                
+                self._start_election()
             except Exception as e:
                 self.logger.error(f"Error in election monitor: {e}")
                 time.sleep(1)  # Back off on error
@@ -129,45 +294,148 @@ class Proposer:
         """Process queued proposals."""
         while not self.stop_threads:
             try:
-                if self.state == LEADER and self.proposal_queue and self.prepare_quorum_achieved:
-                    client_request = self.proposal_queue.popleft()
-                    self._handle_client_proposal(client_request)
-                time.sleep(0.05)  # Check frequently
+                # Blocks while idle and wakes as soon as a request is queued;
+                # stop() queues None to wake it
+                client_request = self.proposal_queue.get()
+                if client_request is None:
+                    return
+                
+                # Hold the request, keeping queue order, until we can propose it
+                while not self._leader_ready.wait(0.1):
+                    if self.stop_threads:
+                        return
+                
+                # Linger briefly so a burst of writes shares one Paxos slot
+                client_requests = [client_request]
+                deadline = time.monotonic() + MAX_WRITE_BATCH_MS / 1000.0
+                while len(client_requests) < MAX_WRITE_BATCH:
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        client_request = self.proposal_queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                    if client_request is None:
+                        return
+                    client_requests.append(client_request)
+                
+                self._handle_client_proposal(client_requests)
             except Exception as e:
                 self.logger.error(f"Error in proposal processor: {e}")
                 time.sleep(1)  # Back off on error
     
+    def _post_acceptor(self, url: str, data: bytes, timeout: float) -> Dict[str, Any]:
+        """POST a packed message to one acceptor and decode its reply."""
+        response = self._session.post(url, data=data, headers=MSGPACK_HEADERS, timeout=timeout)
+        response.raise_for_status()
+        return unpack_message(response.content, response.headers.get('Content-Type'))
+    
+    def _broadcast(self, endpoint: str, data: Union[bytes, Dict[Tuple[str, int], bytes]],
+                   timeout: float,
+                   on_sent: Optional[Callable[[Tuple[str, int]], None]] = None
+                   ) -> Iterator[Dict[str, Any]]:
+        """Send a packed message to every acceptor at once, yielding replies as they arrive.
+        
+        `data` is one body for all acceptors or a body per acceptor; `on_sent`
+        is called with each acceptor that answered, even after the caller
+        stopped reading replies.
+        """
+        def sent(call, host):
+            if not call.cancelled() and call.exception() is None:
+                on_sent(host)
+        
+        calls = {}
+        for host, port in self.acceptor_hosts:
+            body = data if isinstance(data, bytes) else data[(host, port)]
+            call = self._rpc_pool.submit(self._post_acceptor, f"http://{host}:{port}/{endpoint}",
+                                         body, timeout)
+            calls[call] = (host, port)
+            if on_sent is not None:
+                call.add_done_callback(lambda call, host=(host, port): sent(call, host))
+        
+        try:
+            for call in as_completed(calls):
+                try:
+                    reply = call.result()
+                except Exception as e:
+                    host, port = calls[call]
+                    self.logger.warning(f"Failed to send {endpoint} to acceptor {host}:{port}: {e}")
+                    continue
+                yield reply
+        finally:
+            # Once the caller stops (usually on quorum), queued sends are dropped
+            for call in calls:
+                call.cancel()
+    
     def _send_heartbeat(self):
         """Send heartbeat to all nodes."""
         self.heartbeat_sequence += 1
-        heartbeat_msg = HeartbeatMessage(
-            type=HEARTBEAT,
-            leader_id=self.proposer_id,
-            sequence_number=self.heartbeat_sequence,
-            timestamp=time.time()
-        )
-        
-        heartbeat_data = heartbeat_msg.to_dict()
+        full = self._full_heartbeat_needed
+        self._full_heartbeat_needed = False
+        if full:
+            heartbeat_msg = self._heartbeat_msg
+            heartbeat_msg.sequence_number = self.heartbeat_sequence
+            heartbeat_msg.timestamp = time.time_ns()
+            endpoint = "heartbeat"
+            headers = MSGPACK_HEADERS
+        else:
+            # Steady state: who is leading, the sequence number and fresh commits
+            endpoint = "heartbeat_lite"
+            headers = HEARTBEAT_LITE_HEADERS
         
+        # Heartbeats are fire-and-forget; an acceptor still answering the
+        # previous one is skipped so a slow node can't pile them up, and its
+        # commit reports wait for the next message
         for host, port in self.acceptor_hosts:
-            try:
-                url = f"http://{host}:{port}/heartbeat"
-                requests.post(url, json=heartbeat_data, timeout=2)
-            except Exception as e:
-                self.logger.warning(f"Failed to send heartbeat to acceptor {host}:{port}: {e}")
+            previous = self._heartbeat_calls.get((host, port))
+            if previous is not None and not previous.done():
+                continue
+            mark, committed = self._commit_reports.pending((host, port))
+            if full:
+                heartbeat_msg.committed = committed
+                heartbeat_data = pack_message(heartbeat_msg.to_dict())
+            else:
+                heartbeat_data = pack_heartbeat_lite(self.proposer_id, self.heartbeat_sequence, committed)
+            call = self._rpc_pool.submit(self._post_heartbeat, f"http://{host}:{port}/{endpoint}",
+                                         heartbeat_data, headers)
+            call.add_done_callback(
+                lambda call, host=host, port=port, mark=mark: self._heartbeat_done(call, host, port, mark)
+            )
+            self._heartbeat_calls[(host, port)] = call
         
         # Also inform other proposers
         # This would need to be implemented with proposer-to-proposer communication
     
+    def _post_heartbeat(self, url: str, data: bytes, headers: Dict[str, str]):
+        """POST a heartbeat to one acceptor; the ack body is not needed."""
+        response = self._session.post(url, data=data, headers=headers, timeout=2)
+        response.raise_for_status()
+    
+    def _heartbeat_done(self, call, host: str, port: int, mark: int):
+        """Settle the commit reports a heartbeat carried, warning if it failed."""
+        if call.cancelled():
+            return
+        if call.exception() is not None:
+            self.logger.warning(f"Failed to send heartbeat to acceptor {host}:{port}: {call.exception()}")
+            return
+        self._commit_reports.delivered((host, port), mark)
+    
     def _start_election(self):
         """Start the election process."""
-        if self.is_preparing:
-            self.logger.debug("Already in an election, skipping")
-            return
-        
-        self.is_preparing = True
-        self.state = CANDIDATE
-        proposal_number = self._generate_proposal_number()
+        with self._lock:
+            if self.is_preparing:
+                self.logger.debug("Already in an election, skipping")
+                return
+            
+            self.is_preparing = True
+            self.state = CANDIDATE
+            self._leader_ready.clear()
+            proposal_number = self._generate_proposal_number()
+            
+            # Initialize proposal tracking
+            self.active_proposals[proposal_number] = _Proposal()  # Election doesn't have a value
+            self._election_number = proposal_number
         
         self.logger.info(f"Starting election with proposal number {proposal_number}")
         
@@ -178,39 +446,52 @@ class Proposer:
             proposer_id=self.proposer_id
         )
         
-        # Initialize proposal tracking
-        self.active_proposals[proposal_number] = {
-            'value': None,  # Election doesn't have a value
-            'promises': [],
-            'accepted_value': None,
-            'highest_accepted': 0
-        }
-        
         # Send prepare to all acceptors
-        for host, port in self.acceptor_hosts:
+        self.logger.debug(f"Sending PREPARE({proposal_number}) to {len(self.acceptor_hosts)} acceptors")
+        self._send_prepare(proposal_number, pack_message(prepare_msg.to_dict()))
+        
+        # The reaper gives the election up if it doesn't complete
+    
+    def _send_prepare(self, proposal_number: int, prepare_data: bytes):
+        """Broadcast a packed PREPARE and handle promises until a quorum is reached."""
+        for response_data in self._broadcast("prepare", prepare_data, 5):
             try:
-                url = f"http://{host}:{port}/prepare"
-                self.logger.debug(f"Sending PREPARE({proposal_number}) to {host}:{port}")
-                
-                response = requests.post(url, json=prepare_msg.to_dict(), timeout=5)
-                response_data = response.json()
-                
                 self._handle_prepare_response(proposal_number, response_data)
             except Exception as e:
-                self.logger.warning(f"Failed to send prepare to acceptor {host}:{port}: {e}")
-        
-        # Schedule cleanup of the election if it doesn't complete
-        threading.Timer(
-            10.0, 
-            lambda: self._cleanup_election(proposal_number)
-        ).start()
-    
-    def _cleanup_election(self, proposal_number: int):
-        """Clean up an election if it doesn't complete."""
-        if self.is_preparing and proposal_number in self.active_proposals:
-            self.logger.info(f"Election with proposal {proposal_number} timed out")
-            self.is_preparing = False
-            self.active_proposals.pop(proposal_number, None)
+                self.logger.warning(f"Failed to handle prepare response for {proposal_number}: {e}")
+            
+            proposal_data = self.active_proposals.get(proposal_number)
+            if proposal_data is None or proposal_data.promise_count >= self.quorum_size:
+                break
+    
+    def _reap_loop(self):
+        """Periodically drop proposals that never completed."""
+        while not self.stop_threads:
+            self._stop_evt.wait(_REAP_INTERVAL)
+            try:
+                self._reap_stale_proposals()
+            except Exception as e:
+                self.logger.error(f"Error in proposal reaper: {e}")
+    
+    def _reap_stale_proposals(self):
+        """Drop proposals older than _PROPOSAL_EXPIRY, ending an election that didn't complete."""
+        cutoff = time.monotonic() - _PROPOSAL_EXPIRY
+        with self._lock:
+            # Proposals are inserted as they start, so the stale ones come first
+            stale = []
+            for proposal_number, proposal_data in self.active_proposals.items():
+                if proposal_data.created_at >= cutoff:
+                    break
+                stale.append(proposal_number)
+            
+            for proposal_number in stale:
+                del self.active_proposals[proposal_number]
+                if proposal_number == self._election_number and self.is_preparing:
+                    self.logger.info(f"Election with proposal {proposal_number} timed out")
+                    self.is_preparing = False
+                    self._failed_elections += 1
+                else:
+                    self.logger.debug(f"Dropped stale proposal {proposal_number}")
     
     def _handle_prepare_response(self, proposal_number: int, response: Dict[str, Any]):
         """Handle response to a prepare message."""
@@ -221,18 +502,20 @@ class Proposer:
         proposal_data = self.active_proposals[proposal_number]
         
         if response['type'] == PROMISE:
-            # Record the promise
-            proposal_data['promises'].append(response)
-            
-            # Check if this promise contains an accepted value
-            accepted_proposal = response.get('accepted_proposal')
-            if accepted_proposal and accepted_proposal > proposal_data['highest_accepted']:
-                proposal_data['highest_accepted'] = accepted_proposal
-                proposal_data['accepted_value'] = response.get('accepted_value')
+            with self._lock:
+                # Record the promise
+                proposal_data.promise_count += 1
+                
+                # Check if this promise contains an accepted value
+                accepted_proposal = response.get('accepted_proposal')
+                if accepted_proposal and accepted_proposal > proposal_data.highest_accepted:
+                    proposal_data.highest_accepted = accepted_proposal
+                    proposal_data.accepted_value = response.get('accepted_value')
+                
+                quorum_reached = proposal_data.promise_count >= self.quorum_size
             
             # Check if we have a quorum of promises
-            quorum_size = self._calculate_quorum_size()
-            if len(proposal_data['promises']) >= quorum_size:
+            if quorum_reached:
                 self.logger.info(f"Achieved quorum of promises for proposal {proposal_number}")
                 
                 if self.state == CANDIDATE:
@@ -240,34 +523,39 @@ class Proposer:
                     self._become_leader(proposal_number)
                 else:
                     # For regular proposals (not elections), proceed to accept phase
-                    self.prepare_quorum_achieved = True
-                    if proposal_data['accepted_value'] is not None:
+                    with self._lock:
+                        self.prepare_quorum_achieved = True
+                    if proposal_data.accepted_value is not None:
                         # Must use the highest accepted value from promises
-                        self._send_accept(proposal_number, proposal_data['accepted_value'])
+                        self._send_accept(proposal_number, proposal_data.accepted_value)
                     else:
                         # Can use our own value
-                        self._send_accept(proposal_number, proposal_data['value'])
+                        self._send_accept(proposal_number, proposal_data.value)
         
         elif response['type'] == NOT_PROMISE:
             self.logger.info(f"Received NOT_PROMISE for proposal {proposal_number}, "
                            f"promised to {response.get('promised_proposal')}")
             
             # If this is an election and we lose, update our leader
-            if self.state == CANDIDATE:
-                # Could potentially ask who the acceptor is promised to
-                self.is_preparing = False
+            with self._lock:
+                if self.state == CANDIDATE and self.is_preparing:
+                    # Could potentially ask who the acceptor is promised to
+                    self.is_preparing = False
+                    self._failed_elections += 1
     
     def _become_leader(self, proposal_number: int):
         """Transition to leader state after winning election."""
-        self.state = LEADER
-        self.leader_id = self.proposer_id
-        self.prepare_quorum_achieved = True
-        self.is_preparing = False
+        with self._lock:
+            self.state = LEADER
+            self.leader_id = self.proposer_id
+            self.prepare_quorum_achieved = True
+            self.is_preparing = False
+            self._failed_elections = 0
+            self._full_heartbeat_needed = True
+            # Wakes _heartbeat_loop, which announces the leadership right away
+            self._leader_ready.set()
         
         self.logger.info(f"Proposer {self.proposer_id} became leader with proposal {proposal_number}")
-        
-        # Send immediate heartbeat to announce leadership
-        self._send_heartbeat()
     
     def _send_accept(self, proposal_number: int, value: Any):
         """Send accept messages to all acceptors."""
@@ -275,27 +563,45 @@ class Proposer:
             self.logger.warning(f"Trying to send accept for unknown proposal {proposal_number}")
             return
         
-        accept_msg = AcceptMessage(
-            type=ACCEPT,
-            proposal_number=proposal_number,
-            value=value,
-            proposer_id=self.proposer_id
-        )
-        
         proposal_data = self.active_proposals[proposal_number]
-        proposal_data['accepts'] = []
+        proposal_data.accept_count = 0
         
-        for host, port in self.acceptor_hosts:
+        accept_data, marks = self._pack_accept(proposal_number, value)
+        self.logger.debug(f"Sending ACCEPT({proposal_number}, {value}) to {len(self.acceptor_hosts)} acceptors")
+        for response_data in self._broadcast(
+                "accept", accept_data, 5,
+                lambda host: self._commit_reports.delivered(host, marks[host])):
             try:
-                url = f"http://{host}:{port}/accept"
-                self.logger.debug(f"Sending ACCEPT({proposal_number}, {value}) to {host}:{port}")
-                
-                response = requests.post(url, json=accept_msg.to_dict(), timeout=5)
-                response_data = response.json()
-                
                 self._handle_accept_response(proposal_number, response_data)
             except Exception as e:
-                self.logger.warning(f"Failed to send accept to acceptor {host}:{port}: {e}")
+                self.logger.warning(f"Failed to handle accept response for {proposal_number}: {e}")
+            
+            # The proposal is dropped from active_proposals once a quorum accepted
+            if self.active_proposals.get(proposal_number) is not proposal_data:
+                break
+    
+    def _pack_accept(self, proposal_number: int, value: Any
+                     ) -> Tuple[Dict[Tuple[str, int], bytes], Dict[Tuple[str, int], int]]:
+        """Pack an ACCEPT per acceptor as pack_message(AcceptMessage(...).to_dict()) would.
+        
+        Only the trailing commit reports differ between acceptors; the marks
+        returned settle them once an acceptor answers.
+        """
+        pack = self._accept_packer.pack
+        bodies = {}
+        marks = {}
+        with self._accept_pack_lock:
+            head = b''.join((
+                self._accept_prefix,
+                _PROPOSAL_NUMBER_KEY, pack(proposal_number),
+                _VALUE_KEY, pack(value),
+                _TIMESTAMP_KEY, pack(time.time_ns()),
+                _COMMITTED_KEY,
+            ))
+            for host in self.acceptor_hosts:
+                marks[host], committed = self._commit_reports.pending(host)
+                bodies[host] = head + pack(committed)
+        return bodies, marks
     
     def _handle_accept_response(self, proposal_number: int, response: Dict[str, Any]):
         """Handle response to an accept message."""
@@ -306,19 +612,23 @@ class Proposer:
         proposal_data = self.active_proposals[proposal_number]
         
         if response['type'] == ACCEPTED:
-            # Record the acceptance
-            proposal_data['accepts'].append(response)
-            
-            # Check if we have a quorum of acceptances
-            quorum_size = self._calculate_quorum_size()
-            if len(proposal_data['accepts']) >= quorum_size:
-                self.logger.info(f"Achieved quorum of acceptances for proposal {proposal_number}")
+            with self._lock:
+                # Record the acceptance
+                proposal_data.accept_count += 1
                 
-                # Notify client if this was a client request
-                self._notify_client_success(proposal_number)
-                
-                # Cleanup proposal data
-                self.active_proposals.pop(proposal_number, None)
+                # Check if we have a quorum of acceptances
+                if proposal_data.accept_count >= self.quorum_size and proposal_number in self.active_proposals:
+                    self.logger.info(f"Achieved quorum of acceptances for proposal {proposal_number}")
+                    self._preempted_accepts = 0
+                    
+                    # Notify client if this was a client request
+                    self._notify_client_success(proposal_number)
+                    
+                    # One commit to the learners in place of a LEARN from every acceptor
+                    self._send_commit(proposal_number, response.get('value'))
+                    
+                    # Cleanup proposal data
+                    self.active_proposals.pop(proposal_number, None)
         
         elif response['type'] == NOT_ACCEPTED:
             self.logger.info(f"Received NOT_ACCEPTED for proposal {proposal_number}, "
@@ -331,29 +641,80 @@ class Proposer:
                     self.logger.warning(f"Another proposer seems to be active with "
                                       f"higher proposal {promised_proposal}")
                     
-                    # Back off and re-prepare with higher number
-                    time.sleep(random.uniform(0.1, 0.5))
+                    # Back off and re-prepare with higher number, longer each time
+                    # we are preempted again
+                    with self._lock:
+                        attempt = self._preempted_accepts
+                        self._preempted_accepts += 1
+                    time.sleep(0.1 + random.uniform(0, calculate_backoff(attempt, base_ms=400)))
                     if self.state == LEADER:  # Still leader after sleep
-                        self._retry_proposal(proposal_number, proposal_data['value'])
+                        self._retry_proposal(proposal_number, proposal_data.value)
+    
+    def _send_commit(self, proposal_number: int, value: Any):
+        """Tell every learner a proposal is decided, without waiting for their acks."""
+        if not self.learner_hosts:
+            return
+        
+        commit_msg = CommitMessage(
+            type=COMMIT,
+            proposal_number=proposal_number,
+            value=value,
+            proposer_id=self.proposer_id
+        )
+        commit_data = pack_message(commit_msg.to_dict())
+        
+        calls = {}
+        acked = []
+        for host, port in self.learner_hosts:
+            call = self._rpc_pool.submit(self._post_learner, f"http://{host}:{port}/commit", commit_data)
+            calls[call] = (host, port)
+        for call in list(calls):
+            call.add_done_callback(lambda call: self._commit_done(call, proposal_number, calls, acked))
+    
+    def _post_learner(self, url: str, data: bytes):
+        """POST a packed message to one learner; only success matters."""
+        # Give up on a learner early enough that the report still reaches the
+        # acceptors before they broadcast the held LEARNs to everyone
+        response = self._session.post(url, data=data, headers=MSGPACK_HEADERS,
+                                      timeout=COMMIT_FALLBACK_MS / 2000.0)
+        response.raise_for_status()
+    
+    def _commit_done(self, call, proposal_number: int, calls: Dict[Any, Tuple[str, int]],
+                     acked: List[str]):
+        """Record a commit once every learner has answered the COMMIT."""
+        host, port = calls[call]
+        if call.exception() is not None:
+            # The acceptors' held LEARNs reach this learner instead
+            self.logger.warning(f"Failed to send COMMIT({proposal_number}) to learner {host}:{port}: "
+                                f"{call.exception()}")
+        
+        with self._lock:
+            if call.exception() is None:
+                acked.append(f"{host}:{port}")
+            del calls[call]
+            if calls:
+                return
+        
+        if len(acked) == len(self.learner_hosts):
+            self._commit_reports.add(proposal_number)
+        elif acked:
+            self._commit_reports.add([proposal_number, acked])
+        # With no learner reached the acceptors' fallback sends to all of them
     
     def _retry_proposal(self, old_proposal_number: int, value: Any):
         """Retry a proposal that was rejected with a higher proposal number."""
-        # Clean up old proposal
-        self.active_proposals.pop(old_proposal_number, None)
-        
-        # Generate new proposal number
-        new_proposal_number = self._generate_proposal_number()
+        with self._lock:
+            # Clean up old proposal
+            self.active_proposals.pop(old_proposal_number, None)
+            
+            # Generate new proposal number
+            new_proposal_number = self._generate_proposal_number()
+            
+            # Create new proposal tracking
+            self.active_proposals[new_proposal_number] = _Proposal(value=value)
         
         self.logger.info(f"Retrying proposal with number {new_proposal_number}, value: {value}")
         
-        # Create new proposal tracking
-        self.active_proposals[new_proposal_number] = {
-            'value': value,
-            'promises': [],
-            'accepted_value': None,
-            'highest_accepted': 0
-        }
-        
         # Send prepare messages for the new proposal
         prepare_msg = PrepareMessage(
             type=PREPARE,
@@ -361,15 +722,7 @@ class Proposer:
             proposer_id=self.proposer_id
         )
         
-        for host, port in self.acceptor_hosts:
-            try:
-                url = f"http://{host}:{port}/prepare"
-                response = requests.post(url, json=prepare_msg.to_dict(), timeout=5)
-                response_data = response.json()
-                
-                self._handle_prepare_response(new_proposal_number, response_data)
-            except Exception as e:
-                self.logger.warning(f"Failed to send prepare for retry to {host}:{port}: {e}")
+        self._send_prepare(new_proposal_number, pack_message(prepare_msg.to_dict()))
     
     def _notify_client_success(self, proposal_number: int):
         """Notify client of successful proposal."""
@@ -377,9 +730,8 @@ class Proposer:
             return
         
         proposal_data = self.active_proposals[proposal_number]
-        client_request = proposal_data.get('client_request')
         
-        if client_request:
+        for client_request in proposal_data.client_requests or ():
             request_id = client_request.get('request_id')
             client_id = client_request.get('client_id')
             
@@ -393,6 +745,15 @@ class Proposer:
         """Handle a request from a client."""
         request_type = request.get('type')
         
+        # Learners can only apply an operation object; reject anything else
+        # before it is decided into a slot
+        if request_type == WRITE_REQUEST and not isinstance(request.get('operation'), dict):
+            return {
+                "type": "ERROR",
+                "request_id": request.get('request_id'),
+                "error": "Write request needs an operation object"
+            }
+        
         if self.state != LEADER:
             # Redirect to leader if known
             if self.leader_id:
@@ -415,7 +776,7 @@ class Proposer:
             self.logger.info(f"Received write request: {request.get('request_id')}")
             
             # Queue the request for processing
-            self.proposal_queue.append(request)
+            self.proposal_queue.put(request)
             
             # Return acknowledgment
             return {
@@ -427,18 +788,10 @@ class Proposer:
         
         elif request_type == STATUS_REQUEST:
             # Handle status requests
-            status_info = {
-                "proposer_id": self.proposer_id,
-                "state": self.state,
-                "leader_id": self.leader_id,
-                "queue_size": len(self.proposal_queue),
-                "active_proposals": len(self.active_proposals)
-            }
-            
             status_msg = StatusResponseMessage(
                 type="STATUS_RESPONSE",
                 request_id=request.get('request_id'),
-                status_info=status_info
+                status_info=self._status_info()
             )
             
             return status_msg.to_dict()
@@ -451,36 +804,50 @@ class Proposer:
                 "error": f"Unknown request type: {request_type}"
             }
     
-    def _handle_client_proposal(self, client_request: Dict[str, Any]):
-        """Process a client proposal from the queue."""
+    def _status_info(self) -> Dict[str, Any]:
+        """Status snapshot for STATUS_REQUEST, rebuilt at most once per _STATUS_TTL."""
+        now = time.monotonic()
+        taken_at, status_info = self._status_cache
+        if status_info is None or now - taken_at >= _STATUS_TTL:
+            # Only ever serialized, so responses can share the dict
+            status_info = {
+                "proposer_id": self.proposer_id,
+                "state": self.state,
+                "leader_id": self.leader_id,
+                "queue_size": self.proposal_queue.qsize(),
+                "active_proposals": len(self.active_proposals)
+            }
+            self._status_cache = (now, status_info)
+        return status_info
+    
+    def _handle_client_proposal(self, client_requests: List[Dict[str, Any]]):
+        """Propose a batch of queued client requests in a single Paxos slot."""
         if self.state != LEADER:
-            self.logger.warning("Not leader anymore, dropping client proposal")
+            self.logger.warning(f"Not leader anymore, dropping {len(client_requests)} client proposals")
             return
         
         # Generate proposal number
         proposal_number = self._generate_proposal_number()
         
-        # Extract client data
-        request_id = client_request.get('request_id')
-        client_id = client_request.get('client_id')
-        operation = client_request.get('operation')
-        
-        self.logger.info(f"Processing client request {request_id} from {client_id}")
+        # Every slot carries a list of operations, one per request, which
+        # learners apply in order; a lone write is a list of one
+        value = {'operations': [client_request.get('operation') for client_request in client_requests]}
+        if len(client_requests) == 1:
+            client_request = client_requests[0]
+            self.logger.info(f"Processing client request {client_request.get('request_id')} "
+                             f"from {client_request.get('client_id')}")
+        else:
+            self.logger.info(f"Processing batch of {len(client_requests)} client requests "
+                             f"as proposal {proposal_number}")
         
         # Create proposal tracking
-        self.active_proposals[proposal_number] = {
-            'value': operation,
-            'promises': [],
-            'accepts': [],
-            'client_request': client_request,
-            'highest_accepted': 0,
-            'accepted_value': None
-        }
+        with self._lock:
+            self.active_proposals[proposal_number] = _Proposal(value=value, client_requests=client_requests)
         
         # In Multi-Paxos, we skip the prepare phase after becoming leader
         if self.prepare_quorum_achieved:
             # Directly send accept
-            self._send_accept(proposal_number, operation)
+            self._send_accept(proposal_number, value)
         else:
             # Need to do prepare phase first
             prepare_msg = PrepareMessage(
@@ -489,12 +856,4 @@ class Proposer:
                 proposer_id=self.proposer_id
             )
             
-            for host, port in self.acceptor_hosts:
-                try:
-                    url = f"http://{host}:{port}/prepare"
-                    response = requests.post(url, json=prepare_msg.to_dict(), timeout=5)
-                    response_data = response.json()
-                    
-                    self._handle_prepare_response(proposal_number, response_data)
-                except Exception as e:
-                    self.logger.warning(f"Failed to send prepare to {host}:{port}: {e}")
+            self._send_prepare(proposal_number, pack_message(prepare_msg.to_dict()))
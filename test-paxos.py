@@ -42,7 +42,19 @@ def read_value(key, consistency="eventual", host="localhost", port=8000):
         print(f"Error reading value: {e}")
         return None
 
-def run_simple_test(host="localhost", port=8000):
+def write_malformed(host="localhost", port=6001):
+    """Send a write without an operation object straight to a proposer."""
+    try:
+        response = requests.post(
+            f"http://{host}:{port}/request",
+            json={"type": "WRITE_REQUEST", "request_id": "malformed-write", "operation": None}
+        )
+        return response.json()
+    except Exception as e:
+        print(f"Error sending malformed write: {e}")
+        return None
+
+def run_simple_test(host="localhost", port=8000, proposer_host="localhost", proposer_port=6001):
     """Run a simple test sequence."""
     print("Running simple Paxos test...")
     
@@ -55,11 +67,20 @@ def run_simple_test(host="localhost", port=8000):
         print("Failed to get system status")
         return False
     
+    # A malformed write must be rejected, not decided into a slot
+    print("\n2. Sending a malformed write to the proposer...")
+    malformed_response = write_malformed(proposer_host, proposer_port)
+    if malformed_response and malformed_response.get("type") == "ERROR":
+        print(f"✅ Malformed write rejected: {malformed_response.get('error')}")
+    else:
+        print(f"❌ Malformed write not rejected: {malformed_response}")
+        return False
+    
     # Write a value
     test_key = f"test_key_{random.randint(1000, 9999)}"
     test_value = f"test_value_{random.randint(1000, 9999)}"
     
-    print(f"\n2. Writing key-value: {test_key} = {test_value}")
+    print(f"\n3. Writing key-value: {test_key} = {test_value}")
     write_response = write_value(test_key, test_value, host, port)
     if write_response:
         print(f"Write response: {json.dumps(write_response, indent=2)}")
@@ -72,7 +93,7 @@ def run_simple_test(host="localhost", port=8000):
     time.sleep(2)
     
     # Read with eventual consistency
-    print("\n3. Reading with eventual consistency...")
+    print("\n4. Reading with eventual consistency...")
     read_response_eventual = read_value(test_key, "eventual", host, port)
     if read_response_eventual:
         print(f"Read response (eventual): {json.dumps(read_response_eventual, indent=2)}")
@@ -86,7 +107,7 @@ def run_simple_test(host="localhost", port=8000):
         return False
     
     # Read with strong consistency
-    print("\n4. Reading with strong consistency...")
+    print("\n5. Reading with strong consistency...")
     read_response_strong = read_value(test_key, "strong", host, port)
     if read_response_strong:
         print(f"Read response (strong): {json.dumps(read_response_strong, indent=2)}")
@@ -99,7 +120,7 @@ def run_simple_test(host="localhost", port=8000):
         print("Failed to read value with strong consistency")
     
     # Final status check
-    print("\n5. Checking final system status...")
+    print("\n6. Checking final system status...")
     final_status = get_status(host, port)
     if final_status:
         print(f"Final status: {json.dumps(final_status, indent=2)}")
@@ -113,10 +134,12 @@ if __name__ == "__main__":
     parser = argparse.ArgumentParser(description="Test Paxos distributed system")
     parser.add_argument("--host", default="localhost", help="Client API host")
     parser.add_argument("--port", type=int, default=8000, help="Client API port")
+    parser.add_argument("--proposer-host", default="localhost", help="Proposer API host")
+    parser.add_argument("--proposer-port", type=int, default=6001, help="Proposer API port")
     
     args = parser.parse_args()
     
-    success = run_simple_test(args.host, args.port)
+    success = run_simple_test(args.host, args.port, args.proposer_host, args.proposer_port)
     
     if success:
         print("\n✅ All tests passed successfully!")